@@ -14,12 +14,80 @@ class Settings(BaseSettings):
     ollama_num_ctx: int = 2048
     ollama_num_predict: int = 256
     ollama_temperature: float = 0.7
+    # How long Ollama keeps models loaded after a request
+    ollama_keep_alive: str = "30m"
+    ollama_warm_up: bool = True
+
+    # KB chunking ("markdown": heading-aware, sized in estimated tokens;
+    # "chars": paragraph-based, sized in characters)
+    chunk_mode: str = "markdown"
+    chunk_max_tokens: int = 200
+    chunk_overlap_tokens: int = 24
+
+    # Embedding cache
+    embed_cache_path: str = "data/embeddings.sqlite3"
+    embed_cache_max_entries: int = 10000
+
+    # KB ingestion
+    ingest_batch_size: int = 32
+    ingest_concurrency: int = 4
+    ingest_retries: int = 2
+    ingest_read_workers: int = 4
+    ingest_upsert_workers: int = 2
+    ingest_queue_size: int = 64
+    ingest_progress_interval: float = 2.0
+
+    # Vector store backend: "qdrant" or "local" (in-process, small KBs)
+    vector_backend: str = "qdrant"
+    local_vectors_path: str = "data/vectors"
+    local_vectors_hnsw_threshold: int = 50000
 
     # Qdrant
     qdrant_host: str = "localhost"
     qdrant_port: int = 6333
+    qdrant_grpc_port: int = 6334
+    qdrant_prefer_grpc: bool = True
+    qdrant_upsert_batch_size: int = 256
+    qdrant_upsert_parallel: int = 4
     qdrant_collection: str = "weather_kb"
     qdrant_top_k: int = 4
+    qdrant_keep_versions: int = 2
+
+    # Lexical (BM25) retrieval, fused with vector hits
+    lexical_index_path: str = "data/lexical.npz"
+    lexical_k1: float = 1.2
+    lexical_b: float = 0.75
+    lexical_min_score: float = 0.2
+    lexical_fast_path: bool = True
+    lexical_fast_path_margin: float = 2.0
+    rrf_k: int = 60
+
+    # /chat pipeline: weather must arrive within this many seconds of the
+    # request or the answer goes ahead without it
+    chat_context_deadline: float = 2.0
+    # How often a /chat stream checks whether its client has gone away
+    chat_disconnect_poll: float = 0.25
+    # /chat token frames: after the first token, tokens are batched for
+    # up to this many seconds or bytes per SSE frame (0 = one per token)
+    sse_flush_window: float = 0.03
+    sse_flush_bytes: int = 512
+
+    # Prompt packing: the prompt is kept within ollama_num_ctx minus
+    # ollama_num_predict; history gets at most this share of what the
+    # system prompt, question and weather leave
+    prompt_history_share: float = 0.35
+    prompt_min_chunk_tokens: int = 48
+
+    # Generation admission: at most this many /chat answers are generated
+    # at once, with this many more queued; beyond that /chat answers 429
+    max_concurrent_generations: int = 1
+    generation_queue_size: int = 8
+
+    # Semantic answer cache for /chat
+    answer_cache_enabled: bool = True
+    answer_cache_threshold: float = 0.95
+    answer_cache_ttl: float = 86400.0
+    answer_cache_max_entries: int = 512
 
     # External APIs
     open_meteo_url: str = "https://api.open-meteo.com/v1"
@@ -27,6 +95,33 @@ class Settings(BaseSettings):
     nominatim_url: str = "https://nominatim.openstreetmap.org"
     openaq_url: str = "https://api.openaq.org/v2"
 
+    # Outbound HTTP connection pools (one pool per upstream host)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_timeout: float = 10.0
+    http_http2: bool = True
+
+    # Forecast cache (coordinates snapped to a grid in degrees)
+    weather_cache_ttl: float = 900.0
+    weather_cache_stale_ttl: float = 1800.0
+    weather_cache_max_entries: int = 2048
+    weather_cache_grid: float = 0.01
+
+    # Weather fetch pipeline (seconds)
+    weather_forecast_timeout: float = 10.0
+    weather_geocode_timeout: float = 5.0
+    weather_latency_budget: float = 1.5
+
+    # Batch weather endpoint
+    weather_batch_max_locations: int = 100
+    weather_batch_chunk_size: int = 50
+
+    # Reverse geocoding: Nominatim requests per second, and place store
+    nominatim_rate_limit: float = 1.0
+    places_db_path: str = "data/places.sqlite3"
+    places_radius_km: float = 5.0
+
     # Default location (New York)
     default_lat: float = 40.7128
     default_lon: float = -74.0060
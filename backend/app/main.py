@@ -1,12 +1,15 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
+from contextlib import asynccontextmanager
 from datetime import datetime
-import json
+import asyncio
+import weakref
 
 from .config import get_settings
 from .models import (
     WeatherResponse, GeocodeResponse, AQIResponse,
+    BatchWeatherRequest, BatchWeatherResponse, BatchWeatherResult,
     ChatRequest, ChatResponse, Citation,
     IngestRequest, IngestResponse, HealthResponse
 )
@@ -15,14 +18,62 @@ from .services.geocode import GeocodeService
 from .services.aqi import AQIService
 from .services.rag import RAGService
 from .services.ollama import OllamaService
-from .services.qdrant import QdrantService
+from .services.vector_store import create_vector_store
+from .services.http_client import HTTPClientRegistry
+from .services.places import PlaceStore
+from .services.embed_cache import EmbeddingCache
+from .services.answer_cache import AnswerCache, CachedAnswer
+from .services.prompt import SYSTEM_PROMPT, PromptBuilder
+from .services.scheduler import GenerationScheduler, QueueFull, Reservation
+from .utils.ratelimit import RateLimiter
+from .utils.timing import StageTimer
+from .utils.sse import coalesce_tokens, sse_event
 
 settings = get_settings()
 
+# Initialize services
+http_clients = HTTPClientRegistry()
+place_store = PlaceStore()
+# Nominatim allows about one request per second from the whole app
+nominatim_rate = RateLimiter(settings.nominatim_rate_limit)
+weather_service = WeatherService(http_clients, place_store, nominatim_rate)
+geocode_service = GeocodeService(http_clients, nominatim_rate)
+aqi_service = AQIService(http_clients)
+embed_cache = EmbeddingCache()
+ollama_service = OllamaService(http_clients, embed_cache)
+qdrant_service = create_vector_store()
+rag_service = RAGService(ollama_service, qdrant_service)
+answer_cache = AnswerCache()
+prompt_builder = PromptBuilder()
+generation_scheduler = GenerationScheduler()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources and release them on shutdown"""
+    await http_clients.start()
+    await qdrant_service.start()
+    await rag_service.refresh_lexical()
+    # Load the models in the background; the server is usable meanwhile
+    warm_up = None
+    if settings.ollama_warm_up:
+        warm_up = asyncio.create_task(ollama_service.warm_up(SYSTEM_PROMPT))
+    try:
+        yield
+    finally:
+        if warm_up is not None:
+            warm_up.cancel()
+        await http_clients.aclose()
+        await qdrant_service.close()
+        place_store.close()
+        embed_cache.close()
+
+
 app = FastAPI(
     title="Weather AI Assistant API",
     description="Backend for Weather App with RAG-powered chat",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -33,15 +84,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-weather_service = WeatherService()
-geocode_service = GeocodeService()
-aqi_service = AQIService()
-ollama_service = OllamaService()
-qdrant_service = QdrantService()
-rag_service = RAGService(ollama_service, qdrant_service)
-
-
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
@@ -56,18 +98,94 @@ async def health_check():
     )
 
 
+@app.get("/stats")
+async def stats():
+    """Cache and upstream counters for monitoring"""
+    return {
+        "weather_cache": weather_service.forecast_cache.stats(),
+        "places": place_store.stats(),
+        "weather_latency": weather_service.latency.stats(),
+        "embed_cache": embed_cache.stats(),
+        "retrieval": rag_service.stats(),
+        "answer_cache": answer_cache.stats(),
+        "generation": generation_scheduler.stats(),
+        "generation_streams": ollama_service.stream_stats.stats(),
+        "qdrant_upsert": {
+            "total_points": qdrant_service.total_upserted,
+            "last": qdrant_service.last_upsert,
+        },
+        "singleflight": {
+            "forecast": weather_service.forecast_cache.flight.stats(),
+            "reverse_geocode": weather_service.geocode_flight.stats(),
+            "geocode": geocode_service.flight.stats(),
+            "aqi": aqi_service.flight.stats(),
+            "embed": ollama_service.embed_flight.stats(),
+        },
+        "nominatim_rate": nominatim_rate.stats(),
+    }
+
+
 @app.get("/weather", response_model=WeatherResponse)
 async def get_weather(
+    response: Response,
     lat: float = Query(default=settings.default_lat, description="Latitude"),
     lon: float = Query(default=settings.default_lon, description="Longitude"),
-    units: str = Query(default="metric", description="Units: metric or imperial")
+    units: str = Query(default="metric", description="Units: metric or imperial"),
+    hours: int = Query(default=24, ge=1, le=168, description="Hourly forecast length"),
+    response_format: str = Query(
+        default="rows", alias="format", description="Forecast layout: rows or columnar"
+    )
 ):
     """Get current weather and forecast"""
+    if response_format not in ("rows", "columnar"):
+        raise HTTPException(status_code=400, detail="format must be rows or columnar")
+
+    timer = StageTimer()
+    try:
+        if response_format == "columnar":
+            # Column arrays are returned as-is, skipping model validation
+            weather = await weather_service.get_weather_columnar(
+                lat, lon, units, timer, hours
+            )
+            return JSONResponse(
+                weather, headers={"Server-Timing": timer.server_timing()}
+            )
+        weather = await weather_service.get_weather(
+            lat, lon, units, timer, hours
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    response.headers["Server-Timing"] = timer.server_timing()
+    return weather
+
+
+@app.post("/weather/batch", response_model=BatchWeatherResponse)
+async def get_weather_batch(request: BatchWeatherRequest):
+    """Get current weather and forecast for many locations at once"""
+    if len(request.locations) > settings.weather_batch_max_locations:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.weather_batch_max_locations} locations per request"
+        )
+
+    locations = [(loc.lat, loc.lon) for loc in request.locations]
     try:
-        return await weather_service.get_weather(lat, lon, units)
+        weathers = await weather_service.get_weather_batch(
+            locations, request.units
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    return BatchWeatherResponse(results=[
+        BatchWeatherResult(
+            lat=lat,
+            lon=lon,
+            weather=weather if isinstance(weather, WeatherResponse) else None,
+            error=str(weather) if isinstance(weather, Exception) else None
+        )
+        for (lat, lon), weather in zip(locations, weathers)
+    ])
+
 
 @app.get("/geocode", response_model=GeocodeResponse)
 async def geocode(
@@ -98,81 +216,229 @@ async def get_aqi(
         )
 
 
+async def _gather_chat_context(
+    request: ChatRequest, timer: StageTimer
+) -> tuple[list[dict], list[float] | None, WeatherResponse | None, str | None]:
+    """
+    Run KB retrieval and the weather lookup side by side.
+
+    Retrieval is always awaited. The weather only gets until
+    `chat_context_deadline` (counted from the start of the request); if
+    it is slower or fails, the answer goes ahead without it and a notice
+    explains why. Returns the context docs, the query embedding (None if
+    retrieval didn't need one), the weather and the notice.
+    """
+    retrieval = asyncio.create_task(
+        timer.timed("retrieval", rag_service.retrieve(request.message))
+    )
+    weather_task = None
+    if request.lat and request.lon:
+        weather_task = asyncio.create_task(timer.timed(
+            "weather",
+            weather_service.get_weather(request.lat, request.lon, "metric")
+        ))
+
+    try:
+        context_docs, query_vector = await retrieval
+        if weather_task is None:
+            return context_docs, query_vector, None, None
+
+        remaining = settings.chat_context_deadline - timer.elapsed()
+        done, _ = await asyncio.wait([weather_task], timeout=max(remaining, 0))
+        if not done:
+            return context_docs, query_vector, None, "Current weather is taking too long; answering without it."
+        if weather_task.exception() is not None:
+            return context_docs, query_vector, None, "Current weather is unavailable; answering without it."
+        return context_docs, query_vector, weather_task.result(), None
+    finally:
+        # A cached forecast fetch keeps running for the next request
+        for task in (retrieval, weather_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def _watch_disconnect(
+    http_request: Request,
+    disconnected: asyncio.Event,
+    reservation: Reservation
+):
+    """
+    Poll for the client going away during a /chat stream.
+
+    Writes to a closed connection fail silently, so without this the
+    stream would run until Ollama finished the whole answer. On
+    disconnect the generation slot is handed on at once and the event
+    stops the upstream stream.
+    """
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(settings.chat_disconnect_poll)
+    disconnected.set()
+    reservation.release()
+
+
+async def _cached_answer(cached: CachedAnswer, timer: StageTimer):
+    """The SSE events of an answer served from the answer cache"""
+    yield sse_event({"type": "token", "content": cached.answer})
+    yield sse_event({"type": "citations", "citations": cached.citations})
+    yield sse_event({"type": "timing", "timing": timer.as_dict()})
+    yield sse_event({"type": "done", "cached": True})
+
+
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """RAG-powered chat with streaming response"""
+    # Answers only depend on the question and the KB when there is no
+    # conversation history and no live weather in the prompt
+    kb_version = rag_service.kb_version
+    cacheable = (
+        settings.answer_cache_enabled
+        and kb_version is not None
+        and not request.history
+        and not (request.lat and request.lon)
+    )
+    cached = None
+    if cacheable:
+        cached = answer_cache.get_exact(request.message, kb_version)
+    else:
+        answer_cache.bypass()
+    # A repeated question never reaches Ollama, so it takes no queue place
+    if cached is not None:
+        return StreamingResponse(
+            _cached_answer(cached, StageTimer()),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+            }
+        )
+
+    # Turn requests away before streaming starts, while a status code
+    # can still be sent
+    try:
+        reservation = generation_scheduler.reserve()
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
 
     async def generate():
         citations = []
         full_response = ""
+        timer = StageTimer()
+        disconnected = asyncio.Event()
+        watcher = asyncio.create_task(
+            _watch_disconnect(http_request, disconnected, reservation)
+        )
 
         try:
-            # Get relevant context from RAG
-            context_docs = await rag_service.get_context(request.message)
-            citations = [
-                Citation(
-                    source=doc["source"],
-                    content=doc["content"][:200],
-                    score=doc["score"]
-                )
-                for doc in context_docs
-            ]
-
-            # Build prompt with context
-            context_text = "\n\n".join([
-                f"[{doc['source']}]: {doc['content']}"
-                for doc in context_docs
-            ])
+            # Retrieve context and fetch the weather concurrently
+            context_docs, query_vector, weather, notice = await _gather_chat_context(
+                request, timer
+            )
+            # Reuses retrieval's embedding; a lexical fast-path answer has
+            # none, so only the exact lookup (already missed) applies
+            if cacheable:
+                similar = answer_cache.get_similar(query_vector, kb_version)
+                if similar is not None:
+                    async for event in _cached_answer(similar, timer):
+                        yield event
+                    return
+            if notice:
+                yield sse_event({"type": "notice", "message": notice})
 
             # Add weather context if location provided
             weather_context = ""
-            if request.lat and request.lon:
-                try:
-                    weather = await weather_service.get_weather(
-                        request.lat, request.lon, "metric"
-                    )
-                    weather_context = f"""
+            if weather is not None:
+                weather_context = f"""
 Current weather in {weather.location}:
 - Temperature: {weather.current.temperature}°C (feels like {weather.current.feels_like}°C)
 - Conditions: {weather.current.description}
 - Humidity: {weather.current.humidity}%
 - Wind: {weather.current.wind_speed} km/h
 """
-                except:
-                    pass
 
-            system_prompt = f"""You are a helpful weather assistant. Use the following knowledge base context and current weather data to answer questions accurately. Always cite your sources when using information from the knowledge base.
-
-Knowledge Base Context:
-{context_text}
+            # Fit chunks, weather and history into the context window;
+            # static instructions go first so Ollama can reuse the prefix
+            prompt = prompt_builder.build(
+                request.message,
+                context_docs,
+                weather_context,
+                request.history
+            )
+            yield sse_event({"type": "metadata", "tokens": prompt.tokens})
 
-{weather_context}
+            # Cite only the chunks the model actually sees
+            citations = [
+                Citation(
+                    source=doc["source"],
+                    content=doc["content"][:200],
+                    score=doc["score"]
+                )
+                for doc in prompt.docs
+            ]
 
-Guidelines:
-- Be concise and helpful
-- For weather data, use the current weather information provided
-- For explanations about weather concepts, UV, AQI, safety tips, cite the knowledge base
-- If you don't know something, say so
-- If the user asks about a specific time or location not provided, ask for clarification"""
+            # Wait for a generation slot
+            queue_start = timer.elapsed()
+            async for position in reservation.acquire(prompt.tokens["total"]):
+                yield sse_event({"type": "queue", "position": position})
+            timer.record("queue", timer.elapsed() - queue_start)
+            if disconnected.is_set():
+                return
 
             # Stream response from Ollama
-            async for chunk in ollama_service.generate_stream(
-                system_prompt=system_prompt,
-                user_message=request.message,
-                history=request.history
-            ):
+            generation_start = timer.elapsed()
+            # Tokens are batched into frames (see coalesce_tokens)
+            tokens = ollama_service.generate_stream(
+                system_prompt=prompt.system_prompt,
+                user_message=prompt.user_message,
+                history=prompt.history,
+                cancel=disconnected
+            )
+            async for batch in coalesce_tokens(tokens):
+                if not full_response:
+                    timer.record("first_token", timer.elapsed())
+                chunk = "".join(batch)
                 full_response += chunk
-                yield f"data: {json.dumps({'type': 'token', 'content': chunk})}\n\n"
+                yield sse_event({"type": "token", "content": chunk})
+                if not disconnected.is_set():
+                    ollama_service.stream_stats.tokens_delivered += len(batch)
+            timer.record("generation", timer.elapsed() - generation_start)
+
+            # A partial answer is neither sent on nor cached
+            if disconnected.is_set():
+                return
 
             # Send citations at the end
-            yield f"data: {json.dumps({'type': 'citations', 'citations': [c.model_dump() for c in citations]})}\n\n"
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            citation_dicts = [c.model_dump() for c in citations]
+            yield sse_event({"type": "citations", "citations": citation_dicts})
+            yield sse_event({"type": "timing", "timing": timer.as_dict()})
+            yield sse_event({"type": "done"})
+
+            if cacheable and full_response.strip():
+                answer_cache.put(
+                    request.message,
+                    query_vector,
+                    kb_version,
+                    [doc.get("id") for doc in prompt.docs],
+                    full_response,
+                    citation_dicts
+                )
 
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            yield sse_event({"type": "error", "message": str(e)})
+        finally:
+            # Also runs when the client disconnects mid-stream
+            watcher.cancel()
+            reservation.release()
+
+    stream = generate()
+    # A client that leaves before the stream starts never runs its finally
+    weakref.finalize(stream, reservation.release)
 
     return StreamingResponse(
-        generate(),
+        stream,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -197,6 +463,8 @@ async def ingest_document(request: IngestRequest):
             )
 
         chunks_added = await rag_service.ingest(content, request.source)
+        if chunks_added:
+            await rag_service.rebuild_lexical()
 
         return IngestResponse(
             success=True,
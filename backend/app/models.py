@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 
@@ -44,6 +44,27 @@ class WeatherResponse(BaseModel):
     updated_at: str
 
 
+class WeatherLocation(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+
+
+class BatchWeatherRequest(BaseModel):
+    locations: list[WeatherLocation]
+    units: str = "metric"
+
+
+class BatchWeatherResult(BaseModel):
+    lat: float
+    lon: float
+    weather: Optional[WeatherResponse] = None
+    error: Optional[str] = None
+
+
+class BatchWeatherResponse(BaseModel):
+    results: list[BatchWeatherResult]
+
+
 # Geocoding Models
 class GeoLocation(BaseModel):
     name: str
@@ -0,0 +1,160 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import numpy as np
+from .embed_cache import normalize_text
+from ..config import get_settings
+
+settings = get_settings()
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    vector: np.ndarray | None  # None: only matched by the exact question
+    kb_version: str
+    chunk_ids: list[str]
+    answer: str
+    citations: list[dict]
+    created: float = field(default_factory=time.monotonic)
+
+
+class AnswerCache:
+    """
+    Semantic cache of /chat answers.
+
+    A question is answered from cache when an earlier question was the
+    same after normalization, or its embedding is within
+    `answer_cache_threshold` cosine similarity, and both were answered
+    against the same KB version. Entries expire after a TTL and the
+    least recently used are evicted first.
+
+    Only answers that depend on nothing but the question and the KB
+    belong here: the caller bypasses the cache for conversations with
+    history or a location (live weather in the prompt).
+    """
+
+    def __init__(
+        self,
+        threshold: float = None,
+        ttl: float = None,
+        max_entries: int = None
+    ):
+        self.threshold = threshold or settings.answer_cache_threshold
+        self.ttl = ttl or settings.answer_cache_ttl
+        self.max_entries = max_entries or settings.answer_cache_max_entries
+        self._entries: OrderedDict[str, CachedAnswer] = OrderedDict()
+        # Stacked unit vectors of the entries, rebuilt after changes
+        self._matrix: np.ndarray | None = None
+        self._keys: list[str] = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def get_exact(self, query: str, kb_version: str) -> CachedAnswer | None:
+        """Cached answer to the same question, checked before embedding it"""
+        self._expire()
+        key = normalize_text(query)
+        entry = self._entries.get(key)
+        if entry is None or entry.kb_version != kb_version:
+            return None
+        self._entries.move_to_end(key)
+        self.exact_hits += 1
+        return entry
+
+    def get_similar(
+        self, vector: list[float] | None, kb_version: str
+    ) -> CachedAnswer | None:
+        """
+        Cached answer to the most similar question above the threshold.
+        Without a vector (the query was never embedded) this only records
+        the miss.
+        """
+        entry = None
+        if vector is not None:
+            entry = self._nearest(_unit(vector), kb_version)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(normalize_text(entry.query))
+        self.semantic_hits += 1
+        return entry
+
+    def put(
+        self,
+        query: str,
+        vector: list[float] | None,
+        kb_version: str,
+        chunk_ids: list[str],
+        answer: str,
+        citations: list[dict]
+    ):
+        key = normalize_text(query)
+        self._entries[key] = CachedAnswer(
+            query=query,
+            vector=_unit(vector) if vector is not None else None,
+            kb_version=kb_version,
+            chunk_ids=chunk_ids,
+            answer=answer,
+            citations=citations
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def bypass(self):
+        """Count a request that was not eligible for caching"""
+        self.bypassed += 1
+
+    def _nearest(
+        self, vector: np.ndarray, kb_version: str
+    ) -> CachedAnswer | None:
+        if self._matrix is None:
+            self._keys = [
+                key for key, entry in self._entries.items()
+                if entry.vector is not None
+            ]
+            if not self._keys:
+                return None
+            self._matrix = np.stack(
+                [self._entries[key].vector for key in self._keys]
+            )
+
+        similarities = self._matrix @ vector
+        for i in np.argsort(-similarities):
+            if similarities[i] < self.threshold:
+                return None
+            entry = self._entries[self._keys[i]]
+            if entry.kb_version == kb_version:
+                return entry
+        return None
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        expired = [k for k, e in self._entries.items() if e.created < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": (
+                (self.exact_hits + self.semantic_hits) / lookups
+                if lookups else 0.0
+            ),
+        }
+
+
+def _unit(vector: list[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
@@ -1,6 +1,7 @@
-import httpx
 from ..config import get_settings
 from ..models import AQIResponse
+from .http_client import HTTPClientRegistry
+from ..utils.singleflight import SingleFlight
 
 settings = get_settings()
 
@@ -22,85 +23,93 @@ def get_aqi_category(aqi: int) -> str:
 
 
 class AQIService:
-    def __init__(self):
+    def __init__(self, http: HTTPClientRegistry):
+        self.http = http
         self.base_url = settings.openaq_url
+        self.flight = SingleFlight()
 
     async def get_aqi(self, lat: float, lon: float) -> AQIResponse:
         """Get air quality data from OpenAQ"""
+        # Identical lookups in flight share one pair of upstream calls
+        return await self.flight.do(
+            (lat, lon), lambda: self._get_aqi(lat, lon)
+        )
+
+    async def _get_aqi(self, lat: float, lon: float) -> AQIResponse:
         try:
             # Find nearest location
-            async with httpx.AsyncClient() as client:
-                # Search for nearest monitoring station
-                response = await client.get(
-                    f"{self.base_url}/locations",
-                    params={
-                        "coordinates": f"{lat},{lon}",
-                        "radius": 50000,  # 50km radius
-                        "limit": 1,
-                        "order_by": "distance"
-                    },
-                    timeout=10.0
-                )
-
-                if response.status_code != 200:
-                    return self._unavailable_response()
-
-                data = response.json()
-                results = data.get("results", [])
-
-                if not results:
-                    return self._unavailable_response()
-
-                location = results[0]
-                location_id = location["id"]
-
-                # Get latest measurements
-                measurements_response = await client.get(
-                    f"{self.base_url}/latest/{location_id}",
-                    timeout=10.0
-                )
-
-                if measurements_response.status_code != 200:
-                    return self._unavailable_response()
-
-                measurements_data = measurements_response.json()
-                measurements = measurements_data.get("results", [])
-
-                if not measurements:
-                    return self._unavailable_response()
-
-                # Parse measurements
-                pm25 = None
-                pm10 = None
-                o3 = None
-                no2 = None
-
-                for m in measurements[0].get("measurements", []):
-                    param = m.get("parameter")
-                    value = m.get("value")
-                    if param == "pm25":
-                        pm25 = value
-                    elif param == "pm10":
-                        pm10 = value
-                    elif param == "o3":
-                        o3 = value
-                    elif param == "no2":
-                        no2 = value
-
-                # Calculate AQI (simplified - using PM2.5 as primary)
-                aqi = self._calculate_aqi(pm25, pm10, o3, no2)
-                dominant = self._get_dominant_pollutant(pm25, pm10, o3, no2)
-
-                return AQIResponse(
-                    aqi=aqi,
-                    category=get_aqi_category(aqi),
-                    dominant_pollutant=dominant,
-                    pm25=pm25,
-                    pm10=pm10,
-                    o3=o3,
-                    no2=no2,
-                    available=True
-                )
+            client = self.http.get(self.base_url)
+            # Search for nearest monitoring station
+            response = await client.get(
+                f"{self.base_url}/locations",
+                params={
+                    "coordinates": f"{lat},{lon}",
+                    "radius": 50000,  # 50km radius
+                    "limit": 1,
+                    "order_by": "distance"
+                },
+                timeout=10.0
+            )
+
+            if response.status_code != 200:
+                return self._unavailable_response()
+
+            data = response.json()
+            results = data.get("results", [])
+
+            if not results:
+                return self._unavailable_response()
+
+            location = results[0]
+            location_id = location["id"]
+
+            # Get latest measurements
+            measurements_response = await client.get(
+                f"{self.base_url}/latest/{location_id}",
+                timeout=10.0
+            )
+
+            if measurements_response.status_code != 200:
+                return self._unavailable_response()
+
+            measurements_data = measurements_response.json()
+            measurements = measurements_data.get("results", [])
+
+            if not measurements:
+                return self._unavailable_response()
+
+            # Parse measurements
+            pm25 = None
+            pm10 = None
+            o3 = None
+            no2 = None
+
+            for m in measurements[0].get("measurements", []):
+                param = m.get("parameter")
+                value = m.get("value")
+                if param == "pm25":
+                    pm25 = value
+                elif param == "pm10":
+                    pm10 = value
+                elif param == "o3":
+                    o3 = value
+                elif param == "no2":
+                    no2 = value
+
+            # Calculate AQI (simplified - using PM2.5 as primary)
+            aqi = self._calculate_aqi(pm25, pm10, o3, no2)
+            dominant = self._get_dominant_pollutant(pm25, pm10, o3, no2)
+
+            return AQIResponse(
+                aqi=aqi,
+                category=get_aqi_category(aqi),
+                dominant_pollutant=dominant,
+                pm25=pm25,
+                pm10=pm10,
+                o3=o3,
+                no2=no2,
+                available=True
+            )
 
         except Exception as e:
             return self._unavailable_response()
@@ -0,0 +1,132 @@
+import hashlib
+import re
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from ..config import get_settings
+
+settings = get_settings()
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different queries share an embedding"""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Two-level embedding cache keyed on (embed model, normalized text).
+
+    Recent vectors live in an in-memory LRU; every vector is also written
+    to SQLite as float32 bytes so warm entries survive restarts. Rows for
+    any other embed model are dropped on startup.
+    """
+
+    def __init__(
+        self,
+        model: str = None,
+        path: str = None,
+        max_entries: int = None
+    ):
+        self.model = model or settings.ollama_embed_model
+        self.path = path or settings.embed_cache_path
+        self.max_entries = max_entries or settings.embed_cache_max_entries
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL
+            )
+            """
+        )
+        # A different embed model makes every stored vector useless
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE model != ?", (self.model,)
+            )
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(self.model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(normalize_text(text).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, text: str) -> list[float] | None:
+        """Cached embedding for `text`, or None"""
+        key = self.key(text)
+
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return vector.tolist()
+
+        row = self.conn.execute(
+            "SELECT vector FROM embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.disk_hits += 1
+        vector = np.frombuffer(row[0], dtype=np.float32)
+        self._remember(key, vector)
+        return vector.tolist()
+
+    def put(self, text: str, vector: list[float]):
+        """Store an embedding in memory and on disk"""
+        self.put_many([text], [vector])
+
+    def put_many(self, texts: list[str], vectors: list[list[float]]):
+        """Store several embeddings in one transaction"""
+        rows = []
+        for text, vector in zip(texts, vectors):
+            key = self.key(text)
+            array = np.asarray(vector, dtype=np.float32)
+            self._remember(key, array)
+            rows.append((key, self.model, array.tobytes()))
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector) "
+                "VALUES (?, ?, ?)",
+                rows
+            )
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "model": self.model,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (
+                (self.memory_hits + self.disk_hits) / lookups
+                if lookups else 0.0
+            ),
+        }
+
+    def close(self):
+        self.conn.close()
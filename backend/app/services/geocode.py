@@ -1,17 +1,32 @@
-import httpx
 from ..config import get_settings
 from ..models import GeocodeResponse, GeoLocation
+from .http_client import HTTPClientRegistry
+from ..utils.ratelimit import RateLimiter
+from ..utils.singleflight import SingleFlight
 
 settings = get_settings()
 
 
 class GeocodeService:
-    def __init__(self):
+    def __init__(
+        self,
+        http: HTTPClientRegistry,
+        nominatim_rate: RateLimiter = None
+    ):
+        self.http = http
         self.open_meteo_url = settings.open_meteo_geocode_url
         self.nominatim_url = settings.nominatim_url
+        self.nominatim_rate = nominatim_rate or RateLimiter(settings.nominatim_rate_limit)
+        self.flight = SingleFlight()
 
     async def search(self, query: str, limit: int = 5) -> GeocodeResponse:
         """Search for locations by name, with Nominatim fallback"""
+        # Identical searches in flight share one upstream lookup
+        return await self.flight.do(
+            (query, limit), lambda: self._search(query, limit)
+        )
+
+    async def _search(self, query: str, limit: int) -> GeocodeResponse:
         try:
             # Try Open-Meteo first
             results = await self._search_open_meteo(query, limit)
@@ -31,19 +46,19 @@ class GeocodeService:
         self, query: str, limit: int
     ) -> list[GeoLocation]:
         """Search using Open-Meteo Geocoding API"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.open_meteo_url}/search",
-                params={
-                    "name": query,
-                    "count": limit,
-                    "language": "en",
-                    "format": "json"
-                },
-                timeout=5.0
-            )
-            response.raise_for_status()
-            data = response.json()
+        client = self.http.get(self.open_meteo_url)
+        response = await client.get(
+            f"{self.open_meteo_url}/search",
+            params={
+                "name": query,
+                "count": limit,
+                "language": "en",
+                "format": "json"
+            },
+            timeout=5.0
+        )
+        response.raise_for_status()
+        data = response.json()
 
         results = []
         for item in data.get("results", []):
@@ -60,20 +75,22 @@ class GeocodeService:
         self, query: str, limit: int
     ) -> list[GeoLocation]:
         """Search using Nominatim API (fallback)"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.nominatim_url}/search",
-                params={
-                    "q": query,
-                    "format": "json",
-                    "limit": limit,
-                    "addressdetails": 1
-                },
-                headers={"User-Agent": "WeatherApp/1.0"},
-                timeout=5.0
-            )
-            response.raise_for_status()
-            data = response.json()
+        if not await self.nominatim_rate.wait(max_wait=5.0):
+            raise RuntimeError("Nominatim request backlog is full")
+        client = self.http.get(self.nominatim_url)
+        response = await client.get(
+            f"{self.nominatim_url}/search",
+            params={
+                "q": query,
+                "format": "json",
+                "limit": limit,
+                "addressdetails": 1
+            },
+            headers={"User-Agent": "WeatherApp/1.0"},
+            timeout=5.0
+        )
+        response.raise_for_status()
+        data = response.json()
 
         results = []
         for item in data:
@@ -0,0 +1,64 @@
+import httpx
+from urllib.parse import urlsplit
+from ..config import get_settings
+
+settings = get_settings()
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HTTPClientRegistry:
+    """Shared pooled httpx clients, one per upstream host.
+
+    Services ask for a client by base URL and get back a long-lived
+    ``httpx.AsyncClient`` whose connection pool is reused across requests,
+    so we only pay the TCP/TLS handshake once per host.
+    """
+
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._closed = False
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """Get the pooled client for the host serving `url`"""
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+
+        client = self._clients.get(key)
+        if client is None:
+            if self._closed:
+                raise RuntimeError("HTTP client registry is closed")
+            client = self._create_client(parts.scheme)
+            self._clients[key] = client
+        return client
+
+    def _create_client(self, scheme: str) -> httpx.AsyncClient:
+        # HTTP/2 needs TLS (httpx does not speak h2c), so plain-HTTP
+        # upstreams such as a local Ollama stay on HTTP/1.1
+        http2 = settings.http_http2 and scheme == "https" and HTTP2_AVAILABLE
+
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+            timeout=settings.http_timeout,
+        )
+
+    async def start(self):
+        """Reopen the registry (called from the app lifespan)"""
+        self._closed = False
+
+    async def aclose(self):
+        """Close every pooled client"""
+        self._closed = True
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
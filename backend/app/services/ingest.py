@@ -0,0 +1,225 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable
+from .rag import RAGService
+from ..utils.chunker import Chunk, read_blocks
+from ..config import get_settings
+
+settings = get_settings()
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    failed: int = 0
+    added: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    sources: set[str] = field(default_factory=set)
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        elapsed = self.elapsed
+        rate = self.added / elapsed if elapsed else 0.0
+        return (
+            f"{self.files} files, +{self.added} added, -{self.deleted} deleted, "
+            f"={self.unchanged} unchanged, {self.failed} failures "
+            f"in {elapsed:.1f}s ({rate:.1f} chunks/s)"
+        )
+
+
+@dataclass
+class _FileSync:
+    """
+    One file's sync, shared by its batches. Stale points are deleted
+    only once every batch is stored, so retrieval never loses a section
+    mid-ingest, and not at all if any batch failed.
+    """
+    source: str
+    stale: list[str]
+    remaining: int
+    failed: bool = False
+
+
+@dataclass
+class _Batch:
+    file: _FileSync
+    chunks: list[Chunk]
+    vectors: list[list[float]] | None = None
+
+    @property
+    def source(self) -> str:
+        return self.file.source
+
+
+class IngestPipeline:
+    """
+    Streaming KB ingestion with concurrent stages.
+
+    Files flow through read/chunk -> embed -> upsert stages joined by
+    bounded queues, so each stage runs concurrently with the others and a
+    slow stage applies backpressure instead of letting work pile up in
+    memory. Each file is synced incrementally (see `RAGService.sync`).
+    """
+
+    def __init__(
+        self,
+        rag: RAGService,
+        read_workers: int = None,
+        embed_workers: int = None,
+        upsert_workers: int = None,
+        queue_size: int = None,
+        on_progress: Callable[[IngestStats], None] | None = None
+    ):
+        self.rag = rag
+        self.read_workers = read_workers or settings.ingest_read_workers
+        self.embed_workers = embed_workers or settings.ingest_concurrency
+        self.upsert_workers = upsert_workers or settings.ingest_upsert_workers
+        self.queue_size = queue_size or settings.ingest_queue_size
+        self.on_progress = on_progress
+        self.stats = IngestStats()
+
+    async def run(self, files: Iterable[tuple[Path, str]]) -> IngestStats:
+        """Ingest (path, source name) pairs; `files` may be lazy"""
+        self.stats = IngestStats()
+        paths: asyncio.Queue = asyncio.Queue(self.queue_size)
+        to_embed: asyncio.Queue = asyncio.Queue(self.queue_size)
+        to_upsert: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        reporter = asyncio.create_task(self._report())
+        stages = [
+            asyncio.create_task(self._produce(files, paths)),
+            asyncio.create_task(
+                self._stage(paths, to_embed, self.read_workers, self._read)
+            ),
+            asyncio.create_task(
+                self._stage(to_embed, to_upsert, self.embed_workers, self._embed)
+            ),
+            asyncio.create_task(
+                self._stage(to_upsert, None, self.upsert_workers, self._upsert)
+            ),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            # Don't leave the other stages blocked on their queues
+            for task in stages:
+                task.cancel()
+            raise
+        finally:
+            reporter.cancel()
+        return self.stats
+
+    async def _produce(
+        self, files: Iterable[tuple[Path, str]], out: asyncio.Queue
+    ):
+        for item in files:
+            await out.put(item)
+        await out.put(_DONE)
+
+    async def _stage(
+        self,
+        inbox: asyncio.Queue,
+        out: asyncio.Queue | None,
+        workers: int,
+        handle: Callable
+    ):
+        """Run `workers` copies of `handle` until the inbox is drained"""
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    # Let sibling workers see the end marker too
+                    await inbox.put(_DONE)
+                    return
+                await handle(item, out)
+
+        await asyncio.gather(*[worker() for _ in range(workers)])
+        if out is not None:
+            await out.put(_DONE)
+
+    async def _read(self, item: tuple[Path, str], out: asyncio.Queue):
+        path, source = item
+        self.stats.sources.add(source)
+        try:
+            chunks = await asyncio.to_thread(self._chunk_file, path, source)
+            new, stale, unchanged = await self.rag.diff_chunks(chunks, source)
+        except Exception as e:
+            self._fail(source, e)
+            return
+
+        self.stats.files += 1
+        self.stats.unchanged += unchanged
+        size = settings.ingest_batch_size
+        batches = [new[i:i + size] for i in range(0, len(new), size)]
+        file = _FileSync(source, stale, len(batches))
+        if not batches:
+            await self._delete_stale(file)
+            return
+        for chunks in batches:
+            await out.put(_Batch(file, chunks))
+
+    def _chunk_file(self, path: Path, source: str) -> dict[str, Chunk]:
+        """Chunk a file while streaming it, so it is never read whole"""
+        with open(path, encoding="utf-8") as f:
+            return self.rag.chunk(read_blocks(f), source)
+
+    async def _embed(self, batch: _Batch, out: asyncio.Queue):
+        try:
+            batch.vectors = await self.rag.embed_with_retry(
+                [chunk.text for chunk in batch.chunks]
+            )
+        except Exception as e:
+            self._fail_batch(batch, e)
+            return
+        await out.put(batch)
+
+    async def _upsert(self, batch: _Batch, out: None):
+        try:
+            added = await self.rag.qdrant.upsert(
+                batch.vectors,
+                self.rag.build_payloads(batch.chunks, batch.source)
+            )
+        except Exception as e:
+            self._fail_batch(batch, e)
+            return
+        self.stats.added += added
+
+        batch.file.remaining -= 1
+        if batch.file.remaining == 0 and not batch.file.failed:
+            await self._delete_stale(batch.file)
+
+    async def _delete_stale(self, file: _FileSync):
+        """Drop points of the file's old version once the new one is in"""
+        try:
+            self.stats.deleted += await self.rag.qdrant.delete_points(file.stale)
+        except Exception as e:
+            self._fail(file.source, e)
+
+    def _fail_batch(self, batch: _Batch, error: Exception):
+        # Keep the old chunks: the file is still served as it was
+        batch.file.failed = True
+        batch.file.remaining -= 1
+        self._fail(batch.source, error)
+
+    def _fail(self, source: str, error: Exception):
+        # A partially ingested file is picked up again by the next sync
+        self.stats.failed += 1
+        self.stats.errors.append(f"{source}: {error}")
+
+    async def _report(self):
+        if self.on_progress is None:
+            return
+        while True:
+            await asyncio.sleep(settings.ingest_progress_interval)
+            self.on_progress(self.stats)
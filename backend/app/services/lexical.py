@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Iterable
+import numpy as np
+from ..config import get_settings
+
+settings = get_settings()
+
+_TERM = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+_STOPWORDS = frozenset("""
+    a an and are as at be but by can do does for from how i if in is it its
+    me my of on or should so than that the their then there these this to
+    was what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased terms without stopwords, with plurals folded ("storms")"""
+    terms = []
+    for term in _TERM.findall(text.lower()):
+        if term in _STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+def kb_version(point_ids: Iterable[str]) -> str:
+    """Short hash identifying a set of KB points"""
+    digest = hashlib.sha256()
+    for pid in sorted(point_ids):
+        digest.update(pid.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def reciprocal_rank_fusion(
+    *rankings: list[dict],
+    k: int = None,
+    limit: int = None
+) -> list[dict]:
+    """
+    Merge ranked result lists by reciprocal rank fusion.
+
+    Each document scores sum(1 / (k + rank)) over the lists it appears
+    in, so agreement between retrievers matters more than any one raw
+    score. Documents are matched on "id"; the first list's copy wins.
+    """
+    k = k or settings.rrf_k
+    fused: dict[str, list] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            entry = fused.setdefault(doc["id"], [0.0, doc])
+            entry[0] += 1.0 / (k + rank)
+
+    ordered = sorted(fused.values(), key=lambda entry: entry[0], reverse=True)
+    return [doc for _, doc in ordered[:limit]]
+
+
+class LexicalIndex:
+    """
+    In-process BM25 index over the KB chunks.
+
+    Postings are stored as flat NumPy arrays: for term i, the documents
+    and term frequencies live at offsets[i]:offsets[i + 1] of `doc_gaps`
+    (delta-encoded document numbers) and `freqs`. Saved as a compressed
+    .npz, this keeps the index a fraction of the size of the text.
+    """
+
+    def __init__(
+        self,
+        docs: list[dict],
+        terms: list[str],
+        offsets: np.ndarray,
+        doc_gaps: np.ndarray,
+        freqs: np.ndarray,
+        doc_lens: np.ndarray,
+        version: str
+    ):
+        self.docs = docs
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_gaps = doc_gaps
+        self.freqs = freqs
+        self.doc_lens = doc_lens
+        self.version = version
+        self.avg_len = float(doc_lens.mean()) if len(doc_lens) else 0.0
+
+        # BM25 idf per term from its posting list length
+        n = len(docs)
+        df = np.diff(offsets).astype(np.float64)
+        self.idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    @classmethod
+    def build(cls, docs: list[dict]) -> "LexicalIndex":
+        """
+        Index docs with "id", "content" and optionally "source"/"headings".
+
+        Headings are indexed along with the content, so a query naming a
+        section matches every chunk under it.
+        """
+        docs = sorted(docs, key=lambda doc: doc["id"])
+        postings: dict[str, list[tuple[int, int]]] = {}
+        doc_lens = np.zeros(len(docs), dtype=np.uint32)
+
+        for number, doc in enumerate(docs):
+            terms = tokenize(" ".join([*doc.get("headings", []), doc["content"]]))
+            doc_lens[number] = len(terms)
+            for term, freq in Counter(terms).items():
+                postings.setdefault(term, []).append((number, freq))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_numbers = []
+        freqs = []
+        for i, term in enumerate(terms):
+            entries = postings[term]
+            offsets[i + 1] = offsets[i] + len(entries)
+            doc_numbers.extend(number for number, _ in entries)
+            freqs.extend(min(freq, 65535) for _, freq in entries)
+
+        numbers = np.asarray(doc_numbers, dtype=np.int64)
+        # Gaps restart at each term's first document
+        gaps = np.diff(numbers, prepend=0)
+        firsts = offsets[:-1]
+        gaps[firsts] = numbers[firsts]
+
+        return cls(
+            docs=[
+                {
+                    "id": doc["id"],
+                    "source": doc.get("source", ""),
+                    "content": doc["content"],
+                    "headings": list(doc.get("headings", [])),
+                }
+                for doc in docs
+            ],
+            terms=terms,
+            offsets=offsets,
+            doc_gaps=gaps.astype(np.uint32),
+            freqs=np.asarray(freqs, dtype=np.uint16),
+            doc_lens=doc_lens,
+            version=kb_version(doc["id"] for doc in docs)
+        )
+
+    def save(self, path: str):
+        """Write the index atomically, so readers never see a partial file"""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        meta = json.dumps({"version": self.version, "docs": self.docs})
+
+        temp = target.with_name(target.name + ".tmp")
+        with open(temp, "wb") as f:
+            np.savez_compressed(
+                f,
+                terms=np.asarray(terms, dtype=np.str_),
+                offsets=self.offsets,
+                doc_gaps=self.doc_gaps,
+                freqs=self.freqs,
+                doc_lens=self.doc_lens,
+                meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8)
+            )
+        os.replace(temp, target)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            return cls(
+                docs=meta["docs"],
+                terms=data["terms"].tolist(),
+                offsets=data["offsets"],
+                doc_gaps=data["doc_gaps"],
+                freqs=data["freqs"],
+                doc_lens=data["doc_lens"],
+                version=meta["version"]
+            )
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def search(self, query: str, limit: int = None) -> list[dict]:
+        """
+        BM25 top hits for `query`.
+
+        Each hit carries "score" (BM25 relative to the best score any
+        document could get for this query, so in 0..1), the raw "bm25"
+        score and "matched", the fraction of query terms it contains.
+        """
+        limit = limit or settings.qdrant_top_k
+        terms = set(tokenize(query))
+        if not terms or not self.docs:
+            return []
+
+        k1, b = settings.lexical_k1, settings.lexical_b
+        scores = np.zeros(len(self.docs), dtype=np.float64)
+        matched = np.zeros(len(self.docs), dtype=np.int32)
+        best_possible = 0.0
+
+        for term in terms:
+            i = self.vocab.get(term)
+            if i is None:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            docs = np.cumsum(self.doc_gaps[start:end], dtype=np.int64)
+            tf = self.freqs[start:end].astype(np.float64)
+            norm = k1 * (1.0 - b + b * self.doc_lens[docs] / self.avg_len)
+            scores[docs] += self.idf[i] * tf * (k1 + 1.0) / (tf + norm)
+            matched[docs] += 1
+            best_possible += self.idf[i] * (k1 + 1.0)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [
+            {
+                **self.docs[number],
+                "score": float(scores[number] / best_possible),
+                "bm25": float(scores[number]),
+                "matched": float(matched[number] / len(terms)),
+            }
+            for number in ranked
+        ]
+
+    def is_confident(self, hits: list[dict]) -> bool:
+        """
+        Whether lexical hits alone are good enough to answer from.
+
+        The top hit must contain every query term and clearly beat the
+        runner-up, which is typical of keyword queries like "AQI 150".
+        """
+        if not hits:
+            return False
+        top = hits[0]
+        if top["matched"] < 1.0 or top["score"] < settings.lexical_min_score:
+            return False
+        if len(hits) == 1:
+            return True
+        return top["bm25"] >= settings.lexical_fast_path_margin * hits[1]["bm25"]
@@ -0,0 +1,474 @@
+import copy
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+import numpy as np
+from .qdrant import point_id
+from .versioning import VersionedCollections
+from ..config import get_settings
+
+try:
+    import hnswlib
+except ImportError:  # Optional: exact search is used without it
+    hnswlib = None
+
+settings = get_settings()
+
+# Rewrite a version's files once replaced or deleted rows outnumber the
+# live ones (and there are at least this many)
+COMPACT_MIN_DEAD = 1024
+
+
+@dataclass
+class _Collection:
+    """
+    One loaded version. Row r of `matrix` holds the vector of the r-th
+    point record in the log; `ids[r]` and `payloads[r]` are None once
+    that point has been replaced or deleted.
+    """
+    directory: Path
+    manifest: dict
+    stamp: tuple
+    ids: list[str | None] = field(default_factory=list)
+    payloads: list[dict | None] = field(default_factory=list)
+    rows: dict[str, int] = field(default_factory=dict)
+    matrix: np.ndarray = None
+    offset: int = 0  # Bytes of the log applied so far
+    hnsw: object = None
+    _alive: np.ndarray = None
+
+    @property
+    def dim(self) -> int:
+        return self.manifest["dim"]
+
+    @property
+    def dead(self) -> int:
+        return len(self.ids) - len(self.rows)
+
+    def alive(self) -> np.ndarray:
+        """Boolean mask of the rows that still belong to a point"""
+        if self._alive is None:
+            self._alive = np.fromiter(
+                (pid is not None for pid in self.ids), dtype=bool, count=len(self.ids)
+            )
+        return self._alive
+
+    def apply(self, records: list[dict]):
+        """Replay log records onto the in-memory state"""
+        for record in records:
+            if "delete" in record:
+                for pid in record["delete"]:
+                    row = self.rows.pop(pid, None)
+                    if row is not None:
+                        self.ids[row] = self.payloads[row] = None
+                continue
+            pid = record["id"]
+            row = self.rows.get(pid)
+            if row is not None:
+                self.ids[row] = self.payloads[row] = None
+            self.rows[pid] = len(self.ids)
+            self.ids.append(pid)
+            self.payloads.append(record["payload"])
+        self.hnsw = None
+        self._alive = None
+        self.map_vectors()
+
+    def map_vectors(self):
+        n = len(self.ids)
+        if n == 0 or self.dim == 0:
+            self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+        else:
+            self.matrix = np.memmap(
+                self.directory / self.manifest["vectors"],
+                dtype=np.float32, mode="r", shape=(n, self.dim)
+            )
+
+
+class LocalVectorStore(VersionedCollections):
+    """
+    In-process vector store with the same interface as `QdrantService`.
+
+    Meant for single-node deployments with small KBs. Each version is a
+    directory holding a float32 file of unit vectors, memory-mapped on
+    load, and a JSON-lines log of point records (ID and payload, one per
+    vector row) and deletions. Search is one matrix-vector product plus
+    `argpartition`, or an HNSW graph (if `hnswlib` is installed) once a
+    version reaches `local_vectors_hnsw_threshold` points.
+
+    Writes only append, so a full ingest costs I/O in proportion to what
+    it stores: vectors first, then their log records, which means any
+    record a reader sees has its row on disk. Replaced and deleted rows
+    stay behind until they outnumber the live ones; the version is then
+    compacted into new files named by a manifest that is replaced
+    atomically. Other processes (the server, while the ingest script
+    runs) pick up appended records on their next call. There is one
+    writer at a time.
+
+    Versions and the alias behave like their Qdrant counterparts: the
+    alias is a file naming the active version, replaced atomically.
+    """
+
+    def __init__(self, path: str = None):
+        self.root = Path(path or settings.local_vectors_path)
+        self.collection_name = settings.qdrant_collection
+        self.last_upsert: dict = {}
+        self.total_upserted = 0
+        self._loaded: _Collection | None = None
+        self._loaded_name: str | None = None
+
+    async def start(self):
+        """Bootstrap the collection (called on startup, not import)"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        if await self.active_version() is None and not self._dir(self.collection_name).exists():
+            version = await self.create_version()
+            await self.activate(version)
+
+    async def close(self):
+        self._loaded = None
+
+    def for_collection(self, collection_name: str) -> "LocalVectorStore":
+        """A view of this store that reads and writes another collection"""
+        view = copy.copy(self)
+        view.collection_name = collection_name
+        view._loaded = None
+        view._loaded_name = None
+        return view
+
+    # --- Storage primitives for VersionedCollections ---
+
+    async def _create_collection(self, version: str):
+        directory = self._dir(version)
+        directory.mkdir(parents=True)
+        self._write_files(directory, 0, [], np.zeros((0, 0), dtype=np.float32))
+
+    async def _delete_collection(self, version: str):
+        shutil.rmtree(self._dir(version), ignore_errors=True)
+
+    async def _collection_names(self) -> list[str]:
+        if not self.root.exists():
+            return []
+        return [p.name for p in self.root.iterdir() if p.is_dir()]
+
+    async def active_version(self) -> str | None:
+        """The collection the alias currently points at"""
+        try:
+            return self._alias_file().read_text(encoding="utf-8").strip() or None
+        except FileNotFoundError:
+            return None
+
+    async def _point_alias(self, version: str):
+        _replace_text(self._alias_file(), version)
+
+    async def _read_history(self) -> set[str] | None:
+        try:
+            text = self._history_file().read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        return set(json.loads(text))
+
+    async def _write_history(self, versions: set[str]):
+        _replace_text(self._history_file(), json.dumps(sorted(versions)))
+
+    # --- Points ---
+
+    async def check_health(self) -> bool:
+        """The store is local, so it is up whenever its directory is usable"""
+        return self.root.is_dir() and os.access(self.root, os.W_OK)
+
+    async def upsert(
+        self,
+        vectors: list[list[float]],
+        payloads: list[dict]
+    ) -> int:
+        """Insert vectors with metadata, replacing points with the same ID"""
+        start = time.perf_counter()
+        _, collection = self._collection()
+
+        new_rows = _normalize(np.asarray(vectors, dtype=np.float32))
+        count = len(new_rows)
+        if count:
+            if collection.dim == 0:
+                collection.manifest["dim"] = int(new_rows.shape[1])
+                collection.stamp = self._write_manifest(
+                    collection.directory, collection.manifest
+                )
+            records = [
+                {"id": point_id(payload["source"], payload["content"]), "payload": payload}
+                for payload in payloads
+            ]
+            self._append(collection, records, new_rows)
+
+        seconds = time.perf_counter() - start
+        self.total_upserted += count
+        self.last_upsert = {
+            "points": count,
+            "batches": 1,
+            "seconds": round(seconds, 3),
+            "points_per_sec": round(count / seconds, 1) if seconds else 0.0,
+        }
+        return count
+
+    async def search(
+        self,
+        query_vector: list[float],
+        limit: int = None
+    ) -> list[dict]:
+        """Search for similar vectors (cosine similarity)"""
+        if limit is None:
+            limit = settings.qdrant_top_k
+
+        _, collection = self._collection()
+        n = len(collection.rows)
+        if n == 0:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        limit = min(limit, n)
+
+        if hnswlib is not None and n >= settings.local_vectors_hnsw_threshold:
+            rows, scores = self._hnsw_search(collection, query, limit)
+        else:
+            similarities = collection.matrix @ query
+            if collection.dead:
+                similarities[~collection.alive()] = -np.inf
+            rows = np.argpartition(-similarities, limit - 1)[:limit]
+            rows = rows[np.argsort(-similarities[rows])]
+            scores = similarities[rows]
+
+        return [
+            {
+                "id": collection.ids[row],
+                "source": collection.payloads[row].get("source", ""),
+                "content": collection.payloads[row].get("content", ""),
+                "headings": collection.payloads[row].get("headings", []),
+                "score": float(score)
+            }
+            for row, score in zip(rows, scores)
+        ]
+
+    def _hnsw_search(
+        self, collection: _Collection, query: np.ndarray, limit: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if collection.hnsw is None:
+            live = np.flatnonzero(collection.alive())
+            index = hnswlib.Index(space="ip", dim=collection.dim)
+            index.init_index(max_elements=len(live), ef_construction=200, M=16)
+            index.add_items(collection.matrix[live], live)
+            collection.hnsw = index
+        collection.hnsw.set_ef(max(64, limit * 4))
+        labels, distances = collection.hnsw.knn_query(query, k=limit)
+        # Inner-product "distance" is 1 - similarity
+        return labels[0], 1.0 - distances[0]
+
+    async def source_point_ids(self, source: str) -> set[str]:
+        """IDs of every point stored for a source document"""
+        _, collection = self._collection()
+        return {
+            pid for pid, row in collection.rows.items()
+            if collection.payloads[row].get("source") == source
+        }
+
+    async def sources(self) -> set[str]:
+        """Names of every source document in the collection"""
+        _, collection = self._collection()
+        return {
+            collection.payloads[row].get("source", "")
+            for row in collection.rows.values()
+        }
+
+    async def points(self) -> list[dict]:
+        """Every chunk in the collection: id, source, content and headings"""
+        _, collection = self._collection()
+        return [
+            {
+                "id": pid,
+                "source": collection.payloads[row].get("source", ""),
+                "content": collection.payloads[row].get("content", ""),
+                "headings": collection.payloads[row].get("headings", []),
+            }
+            for pid, row in collection.rows.items()
+        ]
+
+    async def point_ids(self) -> set[str]:
+        """IDs of every point in the collection"""
+        _, collection = self._collection()
+        return set(collection.rows)
+
+    async def delete_points(self, ids: list[str]) -> int:
+        """Delete points by ID"""
+        if not ids:
+            return 0
+        _, collection = self._collection()
+        doomed = [pid for pid in ids if pid in collection.rows]
+        if doomed:
+            self._append(collection, [{"delete": doomed}])
+        return len(ids)
+
+    async def delete_collection(self):
+        """Swap in an empty version (for testing/reset)"""
+        version = await self.create_version()
+        await self.activate(version)
+
+    async def count(self) -> int:
+        """Get count of vectors in collection"""
+        try:
+            _, collection = self._collection()
+            return len(collection.rows)
+        except Exception:
+            return 0
+
+    # --- Storage ---
+
+    def _dir(self, name: str) -> Path:
+        return self.root / name
+
+    def _alias_file(self) -> Path:
+        return self.root / f"{self.collection_name}.alias"
+
+    def _history_file(self) -> Path:
+        return self.root / f"{self.collection_name}.history"
+
+    def _resolve(self) -> str:
+        """Concrete version behind `collection_name`"""
+        try:
+            version = self._alias_file().read_text(encoding="utf-8").strip()
+            if version:
+                return version
+        except FileNotFoundError:
+            pass
+        return self.collection_name
+
+    def _collection(self) -> tuple[str, _Collection]:
+        """The current collection, brought up to date with the disk"""
+        name = self._resolve()
+        stamp = _stamp(self._dir(name) / "manifest.json")
+        collection = self._loaded
+        if (
+            collection is None
+            or self._loaded_name != name
+            or collection.stamp != stamp
+        ):
+            collection = self._read(name)
+            self._loaded, self._loaded_name = collection, name
+        else:
+            self._catch_up(collection)
+        return name, collection
+
+    def _read(self, name: str) -> _Collection:
+        directory = self._dir(name)
+        path = directory / "manifest.json"
+        stamp = _stamp(path)
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        collection = _Collection(directory, manifest, stamp)
+        collection.map_vectors()
+        self._catch_up(collection)
+        return collection
+
+    def _catch_up(self, collection: _Collection):
+        """Apply log records appended since the collection was last read"""
+        log = collection.directory / collection.manifest["log"]
+        size = log.stat().st_size
+        if size <= collection.offset:
+            return
+        with open(log, "rb") as f:
+            f.seek(collection.offset)
+            data = f.read(size - collection.offset)
+        # A writer may be part way through a line
+        end = data.rfind(b"\n") + 1
+        if not end:
+            return
+        collection.offset += end
+        collection.apply([json.loads(line) for line in data[:end].splitlines()])
+
+    def _append(
+        self,
+        collection: _Collection,
+        records: list[dict],
+        vectors: np.ndarray = None
+    ):
+        """Append rows and log records, then apply them in memory"""
+        directory = collection.directory
+        if vectors is not None:
+            with open(directory / collection.manifest["vectors"], "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        data = "".join(json.dumps(record) + "\n" for record in records).encode()
+        with open(directory / collection.manifest["log"], "ab") as f:
+            f.write(data)
+        collection.offset += len(data)
+        collection.apply(records)
+
+        if collection.dead > max(len(collection.rows), COMPACT_MIN_DEAD):
+            self._compact(collection)
+
+    def _compact(self, collection: _Collection):
+        """Rewrite a version with only its live rows"""
+        live = np.flatnonzero(collection.alive())
+        records = [
+            {"id": collection.ids[row], "payload": collection.payloads[row]}
+            for row in live
+        ]
+        manifest, stamp = self._write_files(
+            collection.directory, collection.dim, records, collection.matrix[live]
+        )
+        collection.manifest, collection.stamp = manifest, stamp
+        collection.ids, collection.payloads, collection.rows = [], [], {}
+        collection.offset = (collection.directory / manifest["log"]).stat().st_size
+        collection.apply(records)
+
+    def _write_files(
+        self,
+        directory: Path,
+        dim: int,
+        records: list[dict],
+        matrix: np.ndarray
+    ) -> tuple[dict, tuple]:
+        """
+        Write a version from scratch. Vectors and log go to new files that
+        the manifest then points at, so readers see either the old or the
+        new state.
+        """
+        suffix = time.time_ns()
+        vectors, log = f"vectors-{suffix}.f32", f"points-{suffix}.jsonl"
+        np.ascontiguousarray(matrix, dtype=np.float32).tofile(directory / vectors)
+        (directory / log).write_text(
+            "".join(json.dumps(record) + "\n" for record in records),
+            encoding="utf-8"
+        )
+        manifest = {"dim": dim, "vectors": vectors, "log": log}
+        stamp = self._write_manifest(directory, manifest)
+
+        # Older files may still be open in readers; on POSIX they stay
+        # readable after unlinking
+        for old in [*directory.glob("vectors-*.f32"), *directory.glob("points-*.jsonl")]:
+            if old.name not in (vectors, log):
+                try:
+                    old.unlink()
+                except OSError:
+                    pass
+        return manifest, stamp
+
+    def _write_manifest(self, directory: Path, manifest: dict) -> tuple:
+        path = directory / "manifest.json"
+        _replace_text(path, json.dumps(manifest))
+        return _stamp(path)
+
+
+def _stamp(path: Path) -> tuple:
+    """Changes whenever the file is replaced, even within one mtime tick"""
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_ino
+
+
+def _replace_text(path: Path, text: str):
+    """Write a small file atomically"""
+    temp = path.with_name(path.name + ".tmp")
+    temp.write_text(text, encoding="utf-8")
+    os.replace(temp, path)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale vectors (or one vector) to unit length"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
@@ -1,14 +1,40 @@
-import httpx
-from typing import AsyncGenerator
+from typing import AsyncGenerator, AsyncIterator
+import asyncio
 import json
 from ..config import get_settings
 from ..models import ChatMessage
+from .http_client import HTTPClientRegistry
+from .embed_cache import EmbeddingCache
+from ..utils.singleflight import SingleFlight
 
 settings = get_settings()
 
 
-class OllamaService:
+class StreamStats:
+    """Tokens read from Ollama vs tokens that reached the client"""
+
     def __init__(self):
+        self.streams = 0
+        self.aborted = 0
+        self.tokens_generated = 0
+        self.tokens_delivered = 0
+
+    def stats(self) -> dict:
+        return {
+            "streams": self.streams,
+            "aborted": self.aborted,
+            "tokens_generated": self.tokens_generated,
+            "tokens_delivered": self.tokens_delivered,
+            "tokens_wasted": self.tokens_generated - self.tokens_delivered,
+        }
+
+
+class OllamaService:
+    def __init__(self, http: HTTPClientRegistry, embed_cache: EmbeddingCache):
+        self.http = http
+        self.embed_cache = embed_cache
+        self.embed_flight = SingleFlight()
+        self.stream_stats = StreamStats()
         self.base_url = settings.ollama_base_url
         self.model = settings.ollama_model
         self.embed_model = settings.ollama_embed_model
@@ -16,43 +42,94 @@ class OllamaService:
     async def check_health(self) -> bool:
         """Check if Ollama is running"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=5.0
-                )
-                return response.status_code == 200
+            client = self.http.get(self.base_url)
+            response = await client.get(
+                f"{self.base_url}/api/tags",
+                timeout=5.0
+            )
+            return response.status_code == 200
         except:
             return False
 
     async def embed(self, text: str) -> list[float]:
         """Generate embeddings using nomic-embed-text"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/api/embeddings",
-                json={
-                    "model": self.embed_model,
-                    "prompt": text
-                },
-                timeout=30.0
+        vector = self.embed_cache.get(text)
+        if vector is not None:
+            return vector
+
+        return await self.embed_flight.do(
+            self.embed_cache.key(text), lambda: self._embed_remote(text)
+        )
+
+    async def _embed_remote(self, text: str) -> list[float]:
+        """Embed with Ollama and remember the result"""
+        client = self.http.get(self.base_url)
+        response = await client.post(
+            f"{self.base_url}/api/embeddings",
+            json={
+                "model": self.embed_model,
+                "prompt": text,
+                "keep_alive": settings.ollama_keep_alive
+            },
+            timeout=30.0
+        )
+        response.raise_for_status()
+        data = response.json()
+        vector = data["embedding"]
+        self.embed_cache.put(text, vector)
+        return vector
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Embed many texts, sending all cache misses in one /api/embed call"""
+        vectors = [self.embed_cache.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if not missing:
+            return vectors
+
+        missing_texts = [texts[i] for i in missing]
+        client = self.http.get(self.base_url)
+        response = await client.post(
+            f"{self.base_url}/api/embed",
+            json={
+                "model": self.embed_model,
+                "input": missing_texts,
+                "keep_alive": settings.ollama_keep_alive
+            },
+            timeout=120.0
+        )
+        response.raise_for_status()
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(missing_texts):
+            raise ValueError(
+                f"Expected {len(missing_texts)} embeddings, got {len(embeddings)}"
             )
-            response.raise_for_status()
-            data = response.json()
-            return data["embedding"]
+
+        self.embed_cache.put_many(missing_texts, embeddings)
+        for i, vector in zip(missing, embeddings):
+            vectors[i] = vector
+        return vectors
 
     async def generate_stream(
         self,
         system_prompt: str,
         user_message: str,
-        history: list[ChatMessage] = None
+        history: list[ChatMessage] = None,
+        cancel: asyncio.Event = None
     ) -> AsyncGenerator[str, None]:
-        """Generate streaming response from Ollama"""
+        """
+        Generate streaming response from Ollama.
+
+        Setting `cancel` (e.g. when the client disconnects) closes the
+        upstream stream right away, which makes Ollama stop generating,
+        even while it is still processing the prompt.
+        """
 
         # Build messages array
         messages = [{"role": "system", "content": system_prompt}]
 
+        # The caller fits history into the context window (PromptBuilder)
         if history:
-            for msg in history[-6:]:  # Keep last 6 messages for context
+            for msg in history:
                 messages.append({
                     "role": msg.role,
                     "content": msg.content
@@ -60,35 +137,102 @@ class OllamaService:
 
         messages.append({"role": "user", "content": user_message})
 
-        async with httpx.AsyncClient() as client:
-            async with client.stream(
-                "POST",
+        client = self.http.get(self.base_url)
+        request = client.build_request(
+            "POST",
+            f"{self.base_url}/api/chat",
+            json={
+                "model": self.model,
+                "messages": messages,
+                "stream": True,
+                "keep_alive": settings.ollama_keep_alive,
+                "options": {
+                    "num_ctx": settings.ollama_num_ctx,
+                    "num_predict": settings.ollama_num_predict,
+                    "temperature": settings.ollama_temperature,
+                }
+            },
+            timeout=60.0
+        )
+        # Ollama only sends headers once the prompt is processed, so the
+        # wait for them is cancellable too
+        self.stream_stats.streams += 1
+        sending = asyncio.ensure_future(client.send(request, stream=True))
+        if cancel is not None and not await _unless_cancelled(sending, cancel):
+            self.stream_stats.aborted += 1
+            return
+        response = await sending
+
+        finished = False
+        try:
+            response.raise_for_status()
+            lines = response.aiter_lines()
+            if cancel is not None:
+                lines = _until(lines, cancel)
+            async for line in lines:
+                if line:
+                    try:
+                        data = json.loads(line)
+                        if "message" in data:
+                            content = data["message"].get("content", "")
+                            if content:
+                                # Ollama streams one token per message
+                                self.stream_stats.tokens_generated += 1
+                                yield content
+                        if data.get("done"):
+                            finished = True
+                            break
+                    except json.JSONDecodeError:
+                        continue
+        finally:
+            if not finished:
+                self.stream_stats.aborted += 1
+            await response.aclose()
+
+    async def warm_up(self, system_prompt: str) -> bool:
+        """
+        Load both models and prefill the static system prompt.
+
+        Runs a one-token chat with the same options as real requests (a
+        different num_ctx would reload the model), so the first user
+        request finds the model in memory and the system prompt already
+        in Ollama's KV cache.
+        """
+        client = self.http.get(self.base_url)
+        try:
+            response = await client.post(
+                f"{self.base_url}/api/embed",
+                json={
+                    "model": self.embed_model,
+                    "input": "warm up",
+                    "keep_alive": settings.ollama_keep_alive
+                },
+                timeout=120.0
+            )
+            response.raise_for_status()
+
+            response = await client.post(
                 f"{self.base_url}/api/chat",
                 json={
                     "model": self.model,
-                    "messages": messages,
-                    "stream": True,
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": "Hi"}
+                    ],
+                    "stream": False,
+                    "keep_alive": settings.ollama_keep_alive,
                     "options": {
                         "num_ctx": settings.ollama_num_ctx,
-                        "num_predict": settings.ollama_num_predict,
+                        "num_predict": 1,
                         "temperature": settings.ollama_temperature,
                     }
                 },
-                timeout=60.0
-            ) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            if "message" in data:
-                                content = data["message"].get("content", "")
-                                if content:
-                                    yield content
-                            if data.get("done"):
-                                break
-                        except json.JSONDecodeError:
-                            continue
+                timeout=300.0
+            )
+            response.raise_for_status()
+            return True
+        except Exception:
+            return False
 
     async def generate(
         self,
@@ -103,3 +247,35 @@ class OllamaService:
         ):
             full_response += chunk
         return full_response
+
+
+async def _unless_cancelled(
+    future: asyncio.Future, cancel: asyncio.Event
+) -> bool:
+    """Wait for `future` unless `cancel` is set first; then cancel it"""
+    cancelled = asyncio.ensure_future(cancel.wait())
+    try:
+        await asyncio.wait(
+            [future, cancelled], return_when=asyncio.FIRST_COMPLETED
+        )
+        return future.done()
+    finally:
+        cancelled.cancel()
+        if not future.done():
+            future.cancel()
+
+
+async def _until(
+    iterator: AsyncIterator[str], cancel: asyncio.Event
+) -> AsyncIterator[str]:
+    """Items from `iterator` until `cancel` is set, dropping a pending read"""
+    iterator = aiter(iterator)
+    while True:
+        item = asyncio.ensure_future(anext(iterator))
+        if not await _unless_cancelled(item, cancel):
+            return
+        try:
+            line = item.result()
+        except StopAsyncIteration:
+            return
+        yield line
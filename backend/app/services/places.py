@@ -0,0 +1,101 @@
+import sqlite3
+from pathlib import Path
+from typing import Iterable
+from ..config import get_settings
+from ..utils import geohash
+
+settings = get_settings()
+
+
+class PlaceStore:
+    """
+    Persistent store of reverse-geocoded place names.
+
+    Places are kept in SQLite with a geohash column, so a nearest-place
+    query only scans the handful of cells around the requested point.
+    """
+
+    def __init__(self, path: str = None, radius_km: float = None):
+        self.path = path or settings.places_db_path
+        self.radius_km = (
+            radius_km if radius_km is not None else settings.places_radius_km
+        )
+        self.precision = geohash.precision_for_radius(self.radius_km)
+        self.hits = 0
+        self.misses = 0
+
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS places (
+                geohash TEXT NOT NULL,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                name TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS places_geohash ON places (geohash)"
+        )
+        self.conn.commit()
+
+    def nearest(self, lat: float, lon: float) -> str | None:
+        """Name of the closest known place within the radius, if any"""
+        best_name = None
+        best_distance = self.radius_km
+
+        for cell in geohash.covering(lat, lon, self.radius_km, self.precision):
+            # Every full-precision hash in a cell shares its prefix
+            rows = self.conn.execute(
+                "SELECT lat, lon, name FROM places "
+                "WHERE geohash >= ? AND geohash < ?",
+                (cell, cell + "~")
+            )
+            for place_lat, place_lon, name in rows:
+                distance = geohash.haversine_km(lat, lon, place_lat, place_lon)
+                if distance <= best_distance:
+                    best_distance = distance
+                    best_name = name
+
+        if best_name is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best_name
+
+    def add(self, lat: float, lon: float, name: str):
+        """Remember a resolved place"""
+        self.add_many([(lat, lon, name)])
+
+    def add_many(self, places: Iterable[tuple[float, float, str]]) -> int:
+        """Bulk insert (lat, lon, name) rows in one transaction"""
+        rows = [
+            (geohash.encode(lat, lon), lat, lon, name)
+            for lat, lon, name in places
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO places (geohash, lat, lon, name) "
+                "VALUES (?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def count(self) -> int:
+        """Number of stored places"""
+        return self.conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Lookup counters for monitoring"""
+        return {
+            "places": self.count(),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,225 @@
+from dataclasses import dataclass, field
+from ..config import get_settings
+from ..models import ChatMessage
+from ..utils.tokens import estimate_tokens, truncate_tokens
+
+settings = get_settings()
+
+# The system prompt never changes between requests, so Ollama can reuse
+# its KV cache for it (and for the conversation history that follows).
+# Everything request-specific goes into the final user turn instead.
+SYSTEM_PROMPT = """You are a helpful weather assistant. Use the knowledge base context and current weather data provided with each question to answer accurately. Always cite your sources when using information from the knowledge base.
+
+Guidelines:
+- Be concise and helpful
+- For weather data, use the current weather information provided
+- For explanations about weather concepts, UV, AQI, safety tips, cite the knowledge base
+- If you don't know something, say so
+- If the user asks about a specific time or location not provided, ask for clarification"""
+
+# Chat template tokens around each message (role markers, separators)
+MESSAGE_OVERHEAD = 8
+
+
+def build_user_message(
+    question: str,
+    context_text: str,
+    weather_context: str = ""
+) -> str:
+    """The final user turn: variable context sections, then the question"""
+    sections = [f"Knowledge Base Context:\n{context_text}"]
+    if weather_context:
+        sections.append(weather_context.strip())
+    sections.append(f"Question: {question}")
+    return "\n\n".join(sections)
+
+
+def format_doc(doc: dict) -> str:
+    """A retrieved chunk labelled with its source and heading path"""
+    label = " > ".join([doc["source"], *doc.get("headings", [])])
+    return f"[{label}]: {doc['content']}"
+
+
+@dataclass
+class Prompt:
+    system_prompt: str
+    user_message: str
+    history: list[ChatMessage]
+    # The retrieved chunks that made it into the prompt, in rank order
+    docs: list[dict]
+    tokens: dict = field(default_factory=dict)
+
+
+class PromptBuilder:
+    """
+    Packs a /chat prompt into the model's context window.
+
+    Ollama silently drops the start of a prompt longer than num_ctx, so
+    the builder keeps the estimated total within num_ctx minus the
+    tokens reserved for the answer (num_predict). The system prompt,
+    question and weather are always included. What remains is shared
+    between retrieved chunks, taken in rank order, and conversation
+    history, newest message first:
+
+    1. History gets up to `prompt_history_share` of the remaining budget.
+    2. Chunks fill the rest; the first one that doesn't fit is truncated
+       if at least `prompt_min_chunk_tokens` of it would be left.
+    3. Budget the chunks didn't use goes back to older history.
+    4. Messages that still don't fit are replaced by a one-line summary
+       of the questions the user asked in them, if that fits.
+    """
+
+    def __init__(
+        self,
+        num_ctx: int = None,
+        num_predict: int = None,
+        history_share: float = None,
+        min_chunk_tokens: int = None
+    ):
+        self.num_ctx = num_ctx or settings.ollama_num_ctx
+        self.num_predict = num_predict or settings.ollama_num_predict
+        self.history_share = (
+            settings.prompt_history_share
+            if history_share is None else history_share
+        )
+        self.min_chunk_tokens = min_chunk_tokens or settings.prompt_min_chunk_tokens
+
+    @property
+    def budget(self) -> int:
+        """Prompt tokens available once the answer is reserved"""
+        return self.num_ctx - self.num_predict
+
+    def build(
+        self,
+        question: str,
+        docs: list[dict],
+        weather_context: str = "",
+        history: list[ChatMessage] = None,
+        system_prompt: str = SYSTEM_PROMPT
+    ) -> Prompt:
+        history = list(history or [])
+        empty = build_user_message(question, "", weather_context)
+        system_tokens = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD
+        fixed_tokens = estimate_tokens(empty) + MESSAGE_OVERHEAD
+
+        # A question too long for the window keeps its end
+        over = system_tokens + fixed_tokens - self.budget
+        if over > 0:
+            question = truncate_tokens(
+                question, estimate_tokens(question) - over, keep="tail"
+            )
+            empty = build_user_message(question, "", weather_context)
+            fixed_tokens = estimate_tokens(empty) + MESSAGE_OVERHEAD
+        remaining = max(self.budget - system_tokens - fixed_tokens, 0)
+
+        kept, history_tokens = self._fit_history(
+            history, [], int(remaining * self.history_share)
+        )
+        packed, context_tokens, truncated = self._fit_docs(
+            docs, remaining - history_tokens
+        )
+        kept, history_tokens = self._fit_history(
+            history, kept, remaining - context_tokens
+        )
+
+        summarized = 0
+        dropped = history[:len(history) - len(kept)]
+        if dropped:
+            summary = self._summarize(
+                dropped, remaining - context_tokens - history_tokens
+            )
+            if summary is not None:
+                kept.insert(0, summary)
+                history_tokens += estimate_tokens(summary.content) + MESSAGE_OVERHEAD
+                summarized = len(dropped)
+
+        context_text = "\n\n".join(text for _, text in packed)
+        user_message = build_user_message(question, context_text, weather_context)
+        user_tokens = estimate_tokens(user_message) + MESSAGE_OVERHEAD
+
+        return Prompt(
+            system_prompt=system_prompt,
+            user_message=user_message,
+            history=kept,
+            docs=[doc for doc, _ in packed],
+            tokens={
+                "num_ctx": self.num_ctx,
+                "num_predict": self.num_predict,
+                "budget": self.budget,
+                "system": system_tokens,
+                "question": fixed_tokens,
+                "context": user_tokens - fixed_tokens,
+                "history": history_tokens,
+                "total": system_tokens + user_tokens + history_tokens,
+                "docs_used": len(packed),
+                "docs_total": len(docs),
+                "docs_truncated": truncated,
+                "history_used": len(kept) - (1 if summarized else 0),
+                "history_total": len(history),
+                "history_summarized": summarized,
+            }
+        )
+
+    def _fit_history(
+        self,
+        history: list[ChatMessage],
+        kept: list[ChatMessage],
+        budget: int
+    ) -> tuple[list[ChatMessage], int]:
+        """Extend `kept` (a suffix of history) with older messages that fit"""
+        used = sum(
+            estimate_tokens(msg.content) + MESSAGE_OVERHEAD for msg in kept
+        )
+        start = len(history) - len(kept)
+        for msg in reversed(history[:start]):
+            cost = estimate_tokens(msg.content) + MESSAGE_OVERHEAD
+            if used + cost > budget:
+                # The latest message is worth keeping even if only in part
+                if not kept and budget - used - MESSAGE_OVERHEAD >= self.min_chunk_tokens:
+                    content = truncate_tokens(
+                        msg.content, budget - used - MESSAGE_OVERHEAD, keep="tail"
+                    )
+                    kept.insert(0, ChatMessage(role=msg.role, content=content))
+                    used += estimate_tokens(content) + MESSAGE_OVERHEAD
+                break
+            kept.insert(0, msg)
+            used += cost
+        return kept, used
+
+    def _fit_docs(
+        self, docs: list[dict], budget: int
+    ) -> tuple[list[tuple[dict, str]], int, int]:
+        """Chunks in rank order, as (doc, prompt text), within `budget`"""
+        packed = []
+        used = 0
+        truncated = 0
+        for doc in docs:
+            text = format_doc(doc)
+            # Separator between chunks
+            cost = estimate_tokens(text) + (1 if packed else 0)
+            if used + cost <= budget:
+                packed.append((doc, text))
+                used += cost
+                continue
+            room = budget - used - (1 if packed else 0)
+            if room >= self.min_chunk_tokens:
+                text = truncate_tokens(text, room)
+                packed.append((doc, text))
+                used += estimate_tokens(text) + (1 if len(packed) > 1 else 0)
+                truncated += 1
+            break
+        return packed, used, truncated
+
+    def _summarize(
+        self, dropped: list[ChatMessage], budget: int
+    ) -> ChatMessage | None:
+        """A note listing what the user asked in messages that were cut"""
+        questions = [msg.content.strip() for msg in dropped if msg.role == "user"]
+        if not questions:
+            return None
+        prefix = "Earlier in this conversation the user asked: "
+        room = budget - MESSAGE_OVERHEAD - estimate_tokens(prefix)
+        content = truncate_tokens(" | ".join(questions), room, keep="tail")
+        if estimate_tokens(content) < self.min_chunk_tokens // 2:
+            return None
+        return ChatMessage(role="system", content=prefix + content)
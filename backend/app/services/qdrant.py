@@ -1,41 +1,167 @@
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models
-from qdrant_client.http.exceptions import UnexpectedResponse
+import asyncio
+import copy
+import hashlib
+import time
 import uuid
+from itertools import islice
+from .versioning import VersionedCollections
 from ..config import get_settings
 
 settings = get_settings()
 
+# Namespace for content-addressed point IDs
+POINT_NAMESPACE = uuid.UUID("6f1c2a0e-4b7d-5e8f-9a3b-2c1d0e9f8a7b")
+
+
+def chunk_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def point_id(source: str, content: str) -> str:
+    """Deterministic point ID for a chunk of a source document"""
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{source}\0{chunk_hash(content)}"))
+
+
+class QdrantService(VersionedCollections):
+    """
+    Vector store access through a collection alias.
+
+    `collection_name` is an alias that points at one versioned collection
+    (`<alias>_v<timestamp>`). Full rebuilds fill a new version and then
+    swap the alias atomically, so readers never see a half-built KB.
+    """
 
-class QdrantService:
     def __init__(self):
-        self.client = QdrantClient(
+        self.client = AsyncQdrantClient(
             host=settings.qdrant_host,
-            port=settings.qdrant_port
+            port=settings.qdrant_port,
+            grpc_port=settings.qdrant_grpc_port,
+            prefer_grpc=settings.qdrant_prefer_grpc
         )
         self.collection_name = settings.qdrant_collection
-        self._ensure_collection()
+        self.last_upsert: dict = {}
+        self.total_upserted = 0
 
-    def _ensure_collection(self):
-        """Create collection if it doesn't exist"""
+    async def start(self):
+        """Bootstrap the collection (called on startup, not import)"""
+        await self._ensure_collection()
+
+    async def close(self):
+        await self.client.close()
+
+    def for_collection(self, collection_name: str) -> "QdrantService":
+        """A view of this service that reads and writes another collection"""
+        view = copy.copy(self)
+        view.collection_name = collection_name
+        return view
+
+    async def _ensure_collection(self):
+        """Create a first version and alias if neither exists"""
         try:
-            self.client.get_collection(self.collection_name)
-        except (UnexpectedResponse, Exception):
-            try:
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=models.VectorParams(
-                        size=768,  # nomic-embed-text dimension
-                        distance=models.Distance.COSINE
-                    )
+            # Also true for a pre-alias collection with the same name
+            if await self.client.collection_exists(self.collection_name):
+                return
+            version = await self.create_version()
+            await self.activate(version)
+        except:
+            pass  # Collection might already exist
+
+    # --- Storage primitives for VersionedCollections ---
+
+    async def _create_collection(self, version: str):
+        await self.client.create_collection(
+            collection_name=version,
+            vectors_config=models.VectorParams(
+                size=768,  # nomic-embed-text dimension
+                distance=models.Distance.COSINE
+            )
+        )
+        # Incremental ingestion looks points up by source
+        await self.client.create_payload_index(
+            collection_name=version,
+            field_name="source",
+            field_schema=models.PayloadSchemaType.KEYWORD
+        )
+
+    async def _delete_collection(self, version: str):
+        await self.client.delete_collection(version)
+
+    async def _collection_names(self) -> list[str]:
+        response = await self.client.get_collections()
+        return [c.name for c in response.collections]
+
+    async def active_version(self) -> str | None:
+        """The collection the alias currently points at"""
+        response = await self.client.get_aliases()
+        for alias in response.aliases:
+            if alias.alias_name == self.collection_name:
+                return alias.collection_name
+        return None
+
+    async def _point_alias(self, version: str):
+        if self.collection_name in await self._collection_names():
+            # One-off migration from a plain collection: the alias can't
+            # share its name, so the old collection has to go first
+            await self.client.delete_collection(self.collection_name)
+
+        operations = []
+        if await self.active_version() is not None:
+            operations.append(models.DeleteAliasOperation(
+                delete_alias=models.DeleteAlias(alias_name=self.collection_name)
+            ))
+        operations.append(models.CreateAliasOperation(
+            create_alias=models.CreateAlias(
+                collection_name=version,
+                alias_name=self.collection_name
+            )
+        ))
+        await self.client.update_collection_aliases(
+            change_aliases_operations=operations
+        )
+
+    async def _read_history(self) -> set[str] | None:
+        """Activation history, kept in a small Qdrant collection"""
+        history = self._history_collection()
+        if not await self.client.collection_exists(history):
+            return None
+        points, _ = await self.client.scroll(
+            collection_name=history,
+            limit=10_000,
+            with_payload=True,
+            with_vectors=False
+        )
+        return {p.payload["version"] for p in points}
+
+    async def _write_history(self, versions: set[str]):
+        history = self._history_collection()
+        if not await self.client.collection_exists(history):
+            await self.client.create_collection(
+                collection_name=history,
+                vectors_config=models.VectorParams(
+                    size=1, distance=models.Distance.DOT
+                )
+            )
+        await self.client.upsert(
+            collection_name=history,
+            points=[
+                models.PointStruct(
+                    id=str(uuid.uuid5(POINT_NAMESPACE, v)),
+                    vector=[1.0],
+                    payload={"version": v}
                 )
-            except:
-                pass  # Collection might already exist
+                for v in versions
+            ]
+        )
+
+    def _history_collection(self) -> str:
+        return f"{self.collection_name}_history"
 
     async def check_health(self) -> bool:
         """Check if Qdrant is running"""
         try:
-            self.client.get_collections()
+            await self.client.get_collections()
             return True
         except:
             return False
@@ -45,17 +171,58 @@ class QdrantService:
         vectors: list[list[float]],
         payloads: list[dict]
     ) -> int:
-        """Insert vectors with metadata"""
-        points = [
-            models.PointStruct(
-                id=str(uuid.uuid4()),
-                vector=vector,
-                payload=payload
-            )
-            for vector, payload in zip(vectors, payloads)
-        ]
+        """
+        Insert vectors with metadata.
+
+        Points are built and sent in batches of `qdrant_upsert_batch_size`,
+        with up to `qdrant_upsert_parallel` batches in flight, so only a
+        bounded number of points is ever held in memory.
+        """
+        start = time.perf_counter()
+        rows = zip(vectors, payloads)
+        pending: set[asyncio.Task] = set()
+        count = 0
+        batches = 0
+
+        try:
+            while batch := list(islice(rows, settings.qdrant_upsert_batch_size)):
+                if len(pending) >= settings.qdrant_upsert_parallel:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        count += task.result()
+
+                points = [
+                    models.PointStruct(
+                        id=point_id(payload["source"], payload["content"]),
+                        vector=vector,
+                        payload=payload
+                    )
+                    for vector, payload in batch
+                ]
+                pending.add(asyncio.create_task(self._upsert_batch(points)))
+                batches += 1
 
-        self.client.upsert(
+            for count_done in await asyncio.gather(*pending):
+                count += count_done
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+
+        seconds = time.perf_counter() - start
+        self.total_upserted += count
+        self.last_upsert = {
+            "points": count,
+            "batches": batches,
+            "seconds": round(seconds, 3),
+            "points_per_sec": round(count / seconds, 1) if seconds else 0.0,
+        }
+        return count
+
+    async def _upsert_batch(self, points: list[models.PointStruct]) -> int:
+        await self.client.upsert(
             collection_name=self.collection_name,
             points=points
         )
@@ -70,7 +237,7 @@ class QdrantService:
         if limit is None:
             limit = settings.qdrant_top_k
 
-        results = self.client.query_points(
+        results = await self.client.query_points(
             collection_name=self.collection_name,
             query=query_vector,
             limit=limit
@@ -78,25 +245,108 @@ class QdrantService:
 
         return [
             {
+                "id": str(r.id),
                 "source": r.payload.get("source", ""),
                 "content": r.payload.get("content", ""),
+                "headings": r.payload.get("headings", []),
                 "score": r.score
             }
             for r in results.points
         ]
 
+    async def source_point_ids(self, source: str) -> set[str]:
+        """IDs of every point stored for a source document"""
+        return await self._scroll_ids(
+            models.Filter(must=[
+                models.FieldCondition(
+                    key="source",
+                    match=models.MatchValue(value=source)
+                )
+            ])
+        )
+
+    async def sources(self) -> set[str]:
+        """Names of every source document in the collection"""
+        sources = set()
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1000,
+                offset=offset,
+                with_payload=["source"],
+                with_vectors=False
+            )
+            sources.update(p.payload.get("source", "") for p in points)
+            if offset is None:
+                return sources
+
+    async def points(self) -> list[dict]:
+        """Every chunk in the collection: id, source, content and headings"""
+        docs = []
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1000,
+                offset=offset,
+                with_payload=["source", "content", "headings"],
+                with_vectors=False
+            )
+            docs.extend(
+                {
+                    "id": str(p.id),
+                    "source": p.payload.get("source", ""),
+                    "content": p.payload.get("content", ""),
+                    "headings": p.payload.get("headings", []),
+                }
+                for p in points
+            )
+            if offset is None:
+                return docs
+
+    async def point_ids(self) -> set[str]:
+        """IDs of every point in the collection"""
+        return await self._scroll_ids(None)
+
+    async def _scroll_ids(self, scroll_filter: models.Filter | None) -> set[str]:
+        ids = set()
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=1000,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            ids.update(str(p.id) for p in points)
+            if offset is None:
+                return ids
+
+    async def delete_points(self, ids: list[str]) -> int:
+        """Delete points by ID"""
+        if not ids:
+            return 0
+        await self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.PointIdsList(points=ids)
+        )
+        return len(ids)
+
     async def delete_collection(self):
-        """Delete the collection (for testing/reset)"""
+        """Swap in an empty version (for testing/reset)"""
         try:
-            self.client.delete_collection(self.collection_name)
-            self._ensure_collection()
+            version = await self.create_version()
+            await self.activate(version)
         except:
             pass
 
     async def count(self) -> int:
         """Get count of vectors in collection"""
         try:
-            info = self.client.get_collection(self.collection_name)
-            return info.points_count
+            result = await self.client.count(self.collection_name, exact=True)
+            return result.count
         except:
             return 0
@@ -1,18 +1,57 @@
+import asyncio
+import os
+from typing import Iterable
+from .lexical import LexicalIndex, kb_version, reciprocal_rank_fusion
 from .ollama import OllamaService
-from .qdrant import QdrantService
-from ..utils.chunker import chunk_text
+from .qdrant import QdrantService, point_id, chunk_hash
+from ..utils.chunker import Chunk, iter_chunks, iter_markdown_chunks
 from ..config import get_settings
 
 settings = get_settings()
 
 
 class RAGService:
-    def __init__(self, ollama: OllamaService, qdrant: QdrantService):
+    def __init__(
+        self,
+        ollama: OllamaService,
+        qdrant: QdrantService,
+        lexical_path: str = None
+    ):
         self.ollama = ollama
         self.qdrant = qdrant
+        self.lexical_path = lexical_path or settings.lexical_index_path
+        self.lexical: LexicalIndex | None = None
+        self._lexical_mtime: float | None = None
+        self.queries = 0
+        self.fast_path = 0
 
     async def get_context(self, query: str) -> list[dict]:
         """Retrieve relevant context for a query"""
+        docs, _ = await self.retrieve(query)
+        return docs
+
+    async def retrieve(
+        self, query: str
+    ) -> tuple[list[dict], list[float] | None]:
+        """
+        Retrieve relevant context for a query, and its embedding.
+
+        BM25 and vector hits are merged by reciprocal rank fusion. When
+        the BM25 match is unambiguous the embedding round-trip is skipped
+        and the lexical hits are returned directly, with no embedding.
+        """
+        self.queries += 1
+        lexical_hits = []
+        lexical = self._lexical_index()
+        if lexical is not None:
+            hits = lexical.search(query, limit=settings.qdrant_top_k)
+            lexical_hits = [
+                hit for hit in hits if hit["score"] >= settings.lexical_min_score
+            ]
+            if settings.lexical_fast_path and lexical.is_confident(hits):
+                self.fast_path += 1
+                return lexical_hits, None
+
         # Embed the query
         query_vector = await self.ollama.embed(query)
 
@@ -25,29 +64,176 @@ class RAGService:
         # Filter by minimum score threshold
         filtered = [r for r in results if r["score"] > 0.3]
 
-        return filtered
+        docs = reciprocal_rank_fusion(
+            filtered, lexical_hits, limit=settings.qdrant_top_k
+        )
+        return docs, query_vector
+
+    @property
+    def kb_version(self) -> str | None:
+        """Version of the KB the lexical index was built from"""
+        lexical = self._lexical_index()
+        return lexical.version if lexical is not None else None
+
+    def _lexical_index(self) -> LexicalIndex | None:
+        """The lexical index, reloaded if another process rebuilt it"""
+        try:
+            mtime = os.stat(self.lexical_path).st_mtime
+        except OSError:
+            return self.lexical
+        if mtime != self._lexical_mtime:
+            try:
+                self.lexical = LexicalIndex.load(self.lexical_path)
+                self._lexical_mtime = mtime
+            except Exception:
+                pass  # Keep serving the index we have
+        return self.lexical
+
+    async def rebuild_lexical(self) -> LexicalIndex:
+        """Rebuild the lexical index from the chunks in Qdrant and save it"""
+        index = LexicalIndex.build(await self.qdrant.points())
+        index.save(self.lexical_path)
+        self.lexical = index
+        self._lexical_mtime = os.stat(self.lexical_path).st_mtime
+        return index
+
+    async def refresh_lexical(self) -> LexicalIndex | None:
+        """Load the saved lexical index, rebuilding it if Qdrant has moved on"""
+        index = self._lexical_index()
+        try:
+            current = kb_version(await self.qdrant.point_ids())
+            if index is None or index.version != current:
+                index = await self.rebuild_lexical()
+        except Exception:
+            pass  # Qdrant is down; serve the saved index, if any
+        return index
+
+    def stats(self) -> dict:
+        lexical = self.lexical
+        return {
+            "queries": self.queries,
+            "lexical_fast_path": self.fast_path,
+            "lexical_docs": len(lexical) if lexical is not None else 0,
+            "kb_version": lexical.version if lexical is not None else None,
+        }
 
     async def ingest(self, content: str, source: str) -> int:
         """Ingest content into the knowledge base"""
-        # Chunk the content
-        chunks = chunk_text(content, chunk_size=500, overlap=50)
+        chunks = self.chunk(content, source)
+
+        # Chunks are content-addressed, so anything already stored is skipped
+        existing = await self.qdrant.source_point_ids(source)
+        new = {pid: chunk for pid, chunk in chunks.items() if pid not in existing}
+
+        return await self._embed_and_upsert(list(new.values()), source)
+
+    async def sync(self, content: str, source: str) -> dict:
+        """
+        Make the stored chunks of `source` match `content`.
 
+        Only new or changed chunks are embedded; chunks that no longer
+        exist are deleted. Returns counts of added, deleted and unchanged
+        chunks.
+        """
+        new, stale, unchanged = await self.plan_sync(content, source)
+
+        added = await self._embed_and_upsert(new, source)
+        deleted = await self.qdrant.delete_points(stale)
+
+        return {
+            "added": added,
+            "deleted": deleted,
+            "unchanged": unchanged,
+        }
+
+    async def plan_sync(
+        self, content: str, source: str
+    ) -> tuple[list[Chunk], list[str], int]:
+        """
+        Diff `content` against what is stored for `source`.
+
+        Returns the chunks that need embedding, the IDs of stored points
+        that no longer exist, and how many chunks are unchanged.
+        """
+        return await self.diff_chunks(self.chunk(content, source), source)
+
+    async def diff_chunks(
+        self, chunks: dict[str, Chunk], source: str
+    ) -> tuple[list[Chunk], list[str], int]:
+        """`plan_sync` for content that is already chunked"""
+        existing = await self.qdrant.source_point_ids(source)
+
+        new = [chunk for pid, chunk in chunks.items() if pid not in existing]
+        stale = [pid for pid in existing if pid not in chunks]
+        return new, stale, len(chunks) - len(new)
+
+    async def remove_source(self, source: str) -> int:
+        """Delete every chunk of a source document"""
+        existing = await self.qdrant.source_point_ids(source)
+        return await self.qdrant.delete_points(list(existing))
+
+    def chunk(
+        self, content: str | Iterable[str], source: str
+    ) -> dict[str, Chunk]:
+        """
+        Chunk content, keyed by content-addressed point ID. `content` may
+        also be a stream of text pieces, such as `read_blocks(file)`.
+        """
+        stream = [content] if isinstance(content, str) else content
+        if settings.chunk_mode == "markdown":
+            chunks = iter_markdown_chunks(
+                stream,
+                max_tokens=settings.chunk_max_tokens,
+                overlap_tokens=settings.chunk_overlap_tokens
+            )
+        else:
+            chunks = iter_chunks(stream, chunk_size=500, overlap=50)
+        return {point_id(source, chunk.text): chunk for chunk in chunks}
+
+    async def _embed_and_upsert(self, chunks: list[Chunk], source: str) -> int:
+        """Embed chunks and store them"""
         if not chunks:
             return 0
 
-        # Generate embeddings for each chunk
-        vectors = []
-        payloads = []
+        # Embed in batches, a few batches at a time
+        size = settings.ingest_batch_size
+        texts = [chunk.text for chunk in chunks]
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+        limit = asyncio.Semaphore(settings.ingest_concurrency)
 
-        for chunk in chunks:
-            vector = await self.ollama.embed(chunk)
-            vectors.append(vector)
-            payloads.append({
-                "content": chunk,
-                "source": source
-            })
+        async def embed(batch: list[str]) -> list[list[float]]:
+            async with limit:
+                return await self.embed_with_retry(batch)
+
+        results = await asyncio.gather(*[embed(batch) for batch in batches])
+        vectors = [vector for result in results for vector in result]
+        payloads = self.build_payloads(chunks, source)
 
         # Upsert to Qdrant
         count = await self.qdrant.upsert(vectors, payloads)
 
         return count
+
+    def build_payloads(self, chunks: list[Chunk], source: str) -> list[dict]:
+        """Qdrant payloads for chunks of a source document"""
+        return [
+            {
+                "content": chunk.text,
+                "source": source,
+                "chunk_hash": chunk_hash(chunk.text),
+                "headings": list(chunk.headings),
+                "start": chunk.start,
+                "end": chunk.end
+            }
+            for chunk in chunks
+        ]
+
+    async def embed_with_retry(self, batch: list[str]) -> list[list[float]]:
+        """Embed a batch, retrying with backoff if Ollama fails"""
+        for attempt in range(settings.ingest_retries + 1):
+            try:
+                return await self.ollama.embed_batch(batch)
+            except Exception:
+                if attempt == settings.ingest_retries:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
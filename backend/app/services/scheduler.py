@@ -0,0 +1,192 @@
+import asyncio
+import itertools
+import math
+import time
+from typing import AsyncIterator
+from ..config import get_settings
+
+settings = get_settings()
+
+# Shorter prompts go first, but every second of waiting counts as this
+# many fewer prompt tokens, so long prompts are not starved
+AGING_TOKENS_PER_SEC = 200
+
+
+class QueueFull(Exception):
+    """No generation slot or queue place is free"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Generation queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Reservation:
+    """
+    A request's claim on the scheduler, from admission to release.
+
+    Holding a reservation counts against the queue bound even before
+    `acquire` is called, so a request admitted at the HTTP layer cannot
+    be turned away later while it retrieves context.
+    """
+
+    def __init__(self, scheduler: "GenerationScheduler", seq: int):
+        self.scheduler = scheduler
+        self.seq = seq
+        self.tokens = 0
+        self.enqueued = 0.0
+        self.granted_at: float | None = None
+        self.state = "pending"  # pending -> waiting -> active -> released
+        self.changed = asyncio.Event()
+
+    async def acquire(self, tokens: int = 0) -> AsyncIterator[int]:
+        """
+        Wait for a generation slot, yielding the queue position (1-based)
+        each time it changes. Returns once the slot is held.
+        """
+        scheduler = self.scheduler
+        if self.state != "pending":
+            return
+        if scheduler.active < scheduler.max_concurrent and not scheduler.waiting:
+            scheduler._grant(self)
+            return
+
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.state = "waiting"
+        scheduler.pending -= 1
+        scheduler.waiting.append(self)
+        scheduler._notify()
+
+        last = None
+        while self.state == "waiting":
+            position = scheduler.position(self)
+            if position != last:
+                last = position
+                yield position
+            self.changed.clear()
+            await self.changed.wait()
+
+    def release(self):
+        """Give up the slot or queue place; safe to call more than once"""
+        self.scheduler._release(self)
+
+
+class GenerationScheduler:
+    """
+    Admission control in front of Ollama generation.
+
+    At most `max_concurrent` generations run at once; on CPU, parallel
+    generations share the cores and all of them slow down, so it is
+    better to finish some answers quickly and queue the rest. Up to
+    `max_queue` more requests may wait. Beyond that, `reserve` raises
+    `QueueFull` with a Retry-After estimate, so the caller can answer
+    429 before it starts streaming.
+
+    Waiting requests are served shortest prompt first, with aging. A
+    request that is cancelled (client disconnect) releases its place
+    or slot immediately.
+    """
+
+    def __init__(self, max_concurrent: int = None, max_queue: int = None):
+        self.max_concurrent = max_concurrent or settings.max_concurrent_generations
+        self.max_queue = (
+            settings.generation_queue_size if max_queue is None else max_queue
+        )
+        self.active = 0
+        self.pending = 0
+        self.waiting: list[Reservation] = []
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.completed = 0
+        self._wait_total = 0.0
+        self._hold_total = 0.0
+
+    def reserve(self) -> Reservation:
+        """Claim a place for a request, or raise QueueFull"""
+        held = self.active + self.pending + len(self.waiting)
+        if held >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            raise QueueFull(self.retry_after())
+        self.pending += 1
+        self.admitted += 1
+        return Reservation(self, next(self._seq))
+
+    def position(self, reservation: Reservation) -> int:
+        """1-based place of a waiting reservation in service order"""
+        return self._order().index(reservation) + 1
+
+    def retry_after(self) -> int:
+        """Seconds until a queue place is likely to free up"""
+        if not self.completed:
+            return 10
+        hold = self._hold_total / self.completed
+        ahead = self.active + len(self.waiting)
+        return max(1, math.ceil(hold * ahead / self.max_concurrent))
+
+    def _order(self) -> list[Reservation]:
+        now = time.monotonic()
+        return sorted(
+            self.waiting,
+            key=lambda r: (
+                r.tokens - (now - r.enqueued) * AGING_TOKENS_PER_SEC, r.seq
+            )
+        )
+
+    def _grant(self, reservation: Reservation):
+        if reservation.state == "waiting":
+            self._wait_total += time.monotonic() - reservation.enqueued
+        else:
+            self.pending -= 1
+        reservation.state = "active"
+        reservation.granted_at = time.monotonic()
+        self.active += 1
+        reservation.changed.set()
+
+    def _release(self, reservation: Reservation):
+        state = reservation.state
+        reservation.state = "released"
+        if state == "pending":
+            self.pending -= 1
+        elif state == "waiting":
+            self.waiting.remove(reservation)
+            self.cancelled += 1
+            # Ends the reservation's own `acquire` loop
+            reservation.changed.set()
+        elif state == "active":
+            self.active -= 1
+            self.completed += 1
+            self._hold_total += time.monotonic() - reservation.granted_at
+        else:
+            return
+
+        while self.waiting and self.active < self.max_concurrent:
+            following = self._order()[0]
+            self.waiting.remove(following)
+            self._grant(following)
+        self._notify()
+
+    def _notify(self):
+        """Wake waiters so they can report their new positions"""
+        for reservation in self.waiting:
+            reservation.changed.set()
+
+    def stats(self) -> dict:
+        served = self.completed + self.active
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": len(self.waiting),
+            "pending": self.pending,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "completed": self.completed,
+            "avg_wait_ms": round(self._wait_total / served * 1000, 2) if served else 0.0,
+            "avg_hold_ms": (
+                round(self._hold_total / self.completed * 1000, 2)
+                if self.completed else 0.0
+            ),
+        }
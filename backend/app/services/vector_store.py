@@ -0,0 +1,12 @@
+from .qdrant import QdrantService
+from .local_vectors import LocalVectorStore
+from ..config import get_settings
+
+settings = get_settings()
+
+
+def create_vector_store() -> QdrantService | LocalVectorStore:
+    """The vector store selected by `vector_backend` ("qdrant" or "local")"""
+    if settings.vector_backend == "local":
+        return LocalVectorStore()
+    return QdrantService()
@@ -0,0 +1,91 @@
+import time
+from ..config import get_settings
+
+settings = get_settings()
+
+
+class VersionedCollections:
+    """
+    Version and alias policy shared by the vector store backends.
+
+    `collection_name` is an alias pointing at one versioned collection
+    (`<alias>_v<timestamp>`). Rebuilds fill a new version and activate
+    it; every activation is recorded, so rollback and retention only
+    ever consider versions that actually went live, never a leftover
+    from an abandoned rebuild.
+
+    Backends implement the storage primitives: `_create_collection`,
+    `_delete_collection`, `_collection_names`, `active_version`,
+    `_point_alias`, `_read_history` and `_write_history`.
+    """
+
+    collection_name: str
+
+    async def create_version(self) -> str:
+        """Create a new, empty versioned collection and return its name"""
+        now = time.time()
+        stamp = time.strftime("%Y%m%d%H%M%S", time.gmtime(now))
+        version = f"{self.collection_name}_v{stamp}{int(now * 1000) % 1000:03d}"
+        await self._create_collection(version)
+        return version
+
+    async def versions(self) -> list[str]:
+        """All versioned collections behind the alias, oldest first"""
+        prefix = f"{self.collection_name}_v"
+        return sorted(
+            name for name in await self._collection_names()
+            if name.startswith(prefix)
+        )
+
+    async def activate(self, version: str):
+        """Atomically repoint the alias at `version`"""
+        await self._record_activation(version)
+        await self._point_alias(version)
+
+    async def rollback(self) -> str | None:
+        """Point the alias back at the previous version, if there is one"""
+        active = await self.active_version()
+        activated = await self.activated_versions()
+        older = [
+            v for v in await self.versions()
+            if active and v < active and v in activated
+        ]
+        if not older:
+            return None
+        await self.activate(older[-1])
+        return older[-1]
+
+    async def prune_versions(self, keep: int = None) -> list[str]:
+        """
+        Delete versions older than the active one, except the `keep` most
+        recent that were ever live. Never-activated leftovers (abandoned
+        rebuilds) always go.
+        """
+        if keep is None:
+            keep = settings.qdrant_keep_versions
+        active = await self.active_version()
+        activated = await self.activated_versions()
+        older = [v for v in await self.versions() if active and v < active]
+        live = [v for v in older if v in activated]
+        kept = set(live[len(live) - keep:]) if keep > 0 else set()
+        removed = [v for v in older if v not in kept]
+        for version in removed:
+            await self._delete_collection(version)
+        return removed
+
+    async def drop_version(self, version: str):
+        """Delete a version that is not live (e.g. an abandoned rebuild)"""
+        if version != await self.active_version():
+            await self._delete_collection(version)
+
+    async def activated_versions(self) -> set[str]:
+        """Versions the alias has ever pointed at: the rollback targets"""
+        history = await self._read_history()
+        if history is None:
+            # No history kept yet: trust everything up to the active one
+            active = await self.active_version()
+            return {v for v in await self.versions() if active and v <= active}
+        return history
+
+    async def _record_activation(self, version: str):
+        await self._write_history(await self.activated_versions() | {version})
@@ -1,12 +1,26 @@
+import asyncio
 import httpx
+import numpy as np
 from datetime import datetime
+from typing import Callable, TypeVar
 from ..config import get_settings
 from ..models import (
     WeatherResponse, CurrentWeather, HourlyForecast, DailyForecast
 )
+from .http_client import HTTPClientRegistry
+from .places import PlaceStore
+from ..utils.cache import TTLCache, snap
+from ..utils.ratelimit import RateLimiter
+from ..utils.timing import StageTimer, LatencyStats
+from ..utils.singleflight import SingleFlight
 
 settings = get_settings()
 
+T = TypeVar("T")
+
+# Payload key under which a forecast's fetch time is kept
+FETCHED_AT = "_fetched_at"
+
 # WMO Weather interpretation codes
 WMO_CODES = {
     0: ("Clear sky", "☀️"),
@@ -42,64 +56,157 @@ def get_weather_description(code: int) -> tuple[str, str]:
     return WMO_CODES.get(code, ("Unknown", "❓"))
 
 
+def _coordinate_label(lat: float, lon: float) -> str:
+    """Fallback location name when no place name is available"""
+    return f"{lat:.2f}, {lon:.2f}"
+
+
+def _fetched_at(data: dict) -> str:
+    """When a forecast payload was fetched from Open-Meteo"""
+    return data.get(FETCHED_AT) or datetime.utcnow().isoformat()
+
+
+def _float_column(values: list) -> list:
+    """Convert an Open-Meteo series to floats, keeping gaps as None"""
+    column = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(column)
+    if missing.any():
+        return np.where(missing, None, column).tolist()
+    return column.tolist()
+
+
+def _int_column(values: list) -> list[int]:
+    """Convert an Open-Meteo series to ints, treating gaps as 0"""
+    column = np.asarray(values, dtype=np.float64)
+    return np.nan_to_num(column, nan=0.0).astype(np.int64).tolist()
+
+
 class WeatherService:
-    def __init__(self):
+    def __init__(
+        self,
+        http: HTTPClientRegistry,
+        places: PlaceStore,
+        nominatim_rate: RateLimiter = None
+    ):
+        self.http = http
+        self.places = places
         self.base_url = settings.open_meteo_url
+        self.forecast_cache = TTLCache(
+            ttl=settings.weather_cache_ttl,
+            stale_ttl=settings.weather_cache_stale_ttl,
+            max_entries=settings.weather_cache_max_entries
+        )
+        self.latency = LatencyStats()
+        self.geocode_flight = SingleFlight()
+        # Geocodes that outlived the latency budget, kept so they finish
+        # and populate the place store
+        self._background: set[asyncio.Task] = set()
+        # Nominatim's usage policy allows about one request per second
+        # from the whole app; share the limiter with GeocodeService
+        self.nominatim_rate = nominatim_rate or RateLimiter(settings.nominatim_rate_limit)
 
     async def get_weather(
-        self, lat: float, lon: float, units: str = "metric"
+        self,
+        lat: float,
+        lon: float,
+        units: str = "metric",
+        timer: StageTimer | None = None,
+        hours: int = 24
     ) -> WeatherResponse:
         """Fetch weather from Open-Meteo API"""
+        response, location = await self._fetch_and_parse(
+            lat, lon, units, timer,
+            lambda data: self._parse_forecast(data, lat, lon, hours)
+        )
+        if location:
+            response.location = location
+        return response
 
-        # Convert units
-        temp_unit = "celsius" if units == "metric" else "fahrenheit"
-        wind_unit = "kmh" if units == "metric" else "mph"
+    async def get_weather_columnar(
+        self,
+        lat: float,
+        lon: float,
+        units: str = "metric",
+        timer: StageTimer | None = None,
+        hours: int = 24
+    ) -> dict:
+        """
+        Fetch weather with hourly/daily data as column arrays.
 
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "current": [
-                "temperature_2m",
-                "relative_humidity_2m",
-                "apparent_temperature",
-                "weather_code",
-                "wind_speed_10m",
-                "wind_direction_10m"
-            ],
-            "hourly": [
-                "temperature_2m",
-                "weather_code",
-                "precipitation_probability"
-            ],
-            "daily": [
-                "weather_code",
-                "temperature_2m_max",
-                "temperature_2m_min",
-                "precipitation_probability_max",
-                "sunrise",
-                "sunset"
-            ],
-            "temperature_unit": temp_unit,
-            "wind_speed_unit": wind_unit,
-            "timezone": "auto",
-            "forecast_days": 7
-        }
+        Same content as `get_weather`, but `hourly` and `daily` map each
+        field to a list instead of holding one object per row, and the
+        result is a plain dict ready for JSON encoding.
+        """
+        response, location = await self._fetch_and_parse(
+            lat, lon, units, timer,
+            lambda data: self._parse_columnar(data, lat, lon, hours)
+        )
+        if location:
+            response["location"] = location
+        return response
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/forecast",
-                params=params,
-                timeout=10.0
+    async def _fetch_and_parse(
+        self,
+        lat: float,
+        lon: float,
+        units: str,
+        timer: StageTimer | None,
+        parse: Callable[[dict], T]
+    ) -> tuple[T, str | None]:
+        """
+        Run the forecast fetch and reverse geocode concurrently.
+
+        Returns the parsed forecast and the location name, or None for the
+        name if it didn't arrive within the latency budget.
+        """
+        timer = timer or StageTimer()
+
+        # The forecast and the location name are independent, so look up
+        # the name while the forecast is in flight
+        geocode_task = asyncio.create_task(
+            timer.timed("geocode", self._reverse_geocode(lat, lon))
+        )
+
+        # Nearby requests share a cache entry, so fetch for the snapped
+        # grid point rather than the exact coordinates
+        grid_lat = snap(lat, settings.weather_cache_grid)
+        grid_lon = snap(lon, settings.weather_cache_grid)
+        try:
+            data = await timer.timed(
+                "forecast",
+                self.forecast_cache.get_or_fetch(
+                    (grid_lat, grid_lon, units),
+                    lambda: self._fetch_forecast(grid_lat, grid_lon, units)
+                )
+            )
+        except BaseException:
+            geocode_task.cancel()
+            raise
+
+        with timer.stage("parse"):
+            response = parse(data)
+
+        # Don't hold the response for a slow geocode past the budget
+        location = None
+        remaining = settings.weather_latency_budget - timer.elapsed()
+        try:
+            location = await asyncio.wait_for(
+                asyncio.shield(geocode_task), timeout=max(remaining, 0)
             )
-            response.raise_for_status()
-            data = response.json()
+        except asyncio.TimeoutError:
+            self._background.add(geocode_task)
+            geocode_task.add_done_callback(self._background.discard)
+            timer.record("geocode_fallback", 0)
 
-        # Parse current weather
-        current_data = data["current"]
+        self.latency.add(timer)
+        return response, location
+
+    def _parse_current(self, current_data: dict) -> CurrentWeather:
+        """Parse the current conditions block"""
         weather_code = current_data["weather_code"]
         description, icon = get_weather_description(weather_code)
 
-        current = CurrentWeather(
+        return CurrentWeather(
             temperature=current_data["temperature_2m"],
             feels_like=current_data["apparent_temperature"],
             humidity=current_data["relative_humidity_2m"],
@@ -110,10 +217,16 @@ class WeatherService:
             icon=icon
         )
 
-        # Parse hourly forecast (next 24 hours)
+    def _parse_forecast(
+        self, data: dict, lat: float, lon: float, hours: int = 24
+    ) -> WeatherResponse:
+        """Build a response from an Open-Meteo forecast payload"""
+        current = self._parse_current(data["current"])
+
+        # Parse hourly forecast (next `hours` hours)
         hourly_data = data["hourly"]
         hourly = []
-        for i in range(24):
+        for i in range(min(hours, len(hourly_data["time"]))):
             hourly.append(HourlyForecast(
                 time=hourly_data["time"][i],
                 temperature=hourly_data["temperature_2m"][i],
@@ -138,44 +251,301 @@ class WeatherService:
                 sunset=daily_data["sunset"][i]
             ))
 
-        # Get location name (reverse geocode)
-        location_name = await self._reverse_geocode(lat, lon)
-
         return WeatherResponse(
-            location=location_name,
+            location=_coordinate_label(lat, lon),
             lat=lat,
             lon=lon,
             current=current,
             hourly=hourly,
             daily=daily,
             timezone=data.get("timezone", "UTC"),
-            updated_at=datetime.utcnow().isoformat()
+            updated_at=_fetched_at(data)
+        )
+
+    def _parse_columnar(
+        self, data: dict, lat: float, lon: float, hours: int = 24
+    ) -> dict:
+        """Build a columnar response without per-row model construction"""
+        current = self._parse_current(data["current"])
+
+        hourly_data = data["hourly"]
+        n = min(hours, len(hourly_data["time"]))
+        hourly = {
+            "time": hourly_data["time"][:n],
+            "temperature": _float_column(hourly_data["temperature_2m"][:n]),
+            "weather_code": _int_column(hourly_data["weather_code"][:n]),
+            "precipitation_probability": _int_column(
+                hourly_data["precipitation_probability"][:n]
+            ),
+        }
+
+        daily_data = data["daily"]
+        codes = np.asarray(
+            _int_column(daily_data["weather_code"]), dtype=np.int64
+        )
+        # Describe each distinct code once, then fan out by index
+        unique_codes, inverse = np.unique(codes, return_inverse=True)
+        descriptions = np.array(
+            [get_weather_description(int(c))[0] for c in unique_codes],
+            dtype=object
+        )
+        daily = {
+            "date": daily_data["time"],
+            "temp_max": _float_column(daily_data["temperature_2m_max"]),
+            "temp_min": _float_column(daily_data["temperature_2m_min"]),
+            "weather_code": codes.tolist(),
+            "description": descriptions[inverse].tolist(),
+            "precipitation_probability": _int_column(
+                daily_data["precipitation_probability_max"]
+            ),
+            "sunrise": daily_data["sunrise"],
+            "sunset": daily_data["sunset"],
+        }
+
+        return {
+            "location": _coordinate_label(lat, lon),
+            "lat": lat,
+            "lon": lon,
+            "current": current.model_dump(),
+            "hourly": hourly,
+            "daily": daily,
+            "timezone": data.get("timezone", "UTC"),
+            "updated_at": _fetched_at(data),
+        }
+
+    async def get_weather_batch(
+        self,
+        locations: list[tuple[float, float]],
+        units: str = "metric"
+    ) -> list[WeatherResponse | Exception]:
+        """
+        Fetch weather for many locations with as few upstream calls as possible.
+
+        Cached forecasts are reused; the rest are fetched with Open-Meteo
+        multi-coordinate requests of up to `weather_batch_chunk_size`
+        locations each. Returns one entry per location, either the weather
+        or the exception that prevented it.
+        """
+        if not locations:
+            return []
+        timer = StageTimer()
+
+        geocode_tasks = [
+            asyncio.create_task(self._reverse_geocode(lat, lon))
+            for lat, lon in locations
+        ]
+
+        keys = [
+            (
+                snap(lat, settings.weather_cache_grid),
+                snap(lon, settings.weather_cache_grid),
+                units
+            )
+            for lat, lon in locations
+        ]
+
+        forecasts: dict[tuple, dict | Exception] = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            data = self.forecast_cache.peek(key)
+            if data is None:
+                missing.append(key)
+            else:
+                forecasts[key] = data
+
+        size = settings.weather_batch_chunk_size
+        chunks = [missing[i:i + size] for i in range(0, len(missing), size)]
+        results = await timer.timed("forecast", asyncio.gather(
+            *[self._fetch_forecasts(chunk, units) for chunk in chunks],
+            return_exceptions=True
+        ))
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                for key in chunk:
+                    forecasts[key] = result
+                continue
+            for key, data in zip(chunk, result):
+                if not isinstance(data, Exception):
+                    self.forecast_cache.set(key, data)
+                forecasts[key] = data
+
+        responses = []
+        with timer.stage("parse"):
+            for (lat, lon), key in zip(locations, keys):
+                data = forecasts[key]
+                if isinstance(data, Exception):
+                    responses.append(data)
+                    continue
+                try:
+                    responses.append(self._parse_forecast(data, lat, lon))
+                except Exception as e:
+                    responses.append(e)
+
+        # Same latency budget as a single request; late names fall back
+        remaining = settings.weather_latency_budget - timer.elapsed()
+        _, pending = await asyncio.wait(
+            geocode_tasks, timeout=max(remaining, 0)
+        )
+        for task in pending:
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+        for response, task in zip(responses, geocode_tasks):
+            if not isinstance(response, WeatherResponse) or not task.done():
+                continue
+            # A failed lookup keeps the coordinate label for that location
+            if not task.cancelled() and task.exception() is None:
+                response.location = task.result()
+
+        return responses
+
+    async def _fetch_forecasts(
+        self, keys: list[tuple], units: str
+    ) -> list[dict | Exception]:
+        """
+        Fetch forecasts for several (lat, lon, units) keys in one call.
+
+        Open-Meteo rejects the whole call (4xx) if any one coordinate is
+        bad, so a rejected call is split in halves and retried until the
+        bad keys are isolated; each of those gets its own exception.
+        """
+        try:
+            data = await self._fetch_forecast(
+                ",".join(str(lat) for lat, _, _ in keys),
+                ",".join(str(lon) for _, lon, _ in keys),
+                units
+            )
+        except httpx.HTTPStatusError as e:
+            if len(keys) == 1 or not e.response.is_client_error:
+                raise
+            middle = len(keys) // 2
+            halves = await asyncio.gather(
+                self._fetch_forecasts(keys[:middle], units),
+                self._fetch_forecasts(keys[middle:], units),
+                return_exceptions=True
+            )
+            results = []
+            for half, result in zip((keys[:middle], keys[middle:]), halves):
+                results.extend([result] * len(half) if isinstance(result, Exception) else result)
+            return results
+        # Open-Meteo only returns a list when more than one point is asked for
+        results = data if isinstance(data, list) else [data]
+        if len(results) != len(keys):
+            raise ValueError(
+                f"Expected {len(keys)} forecasts, got {len(results)}"
+            )
+        return results
+
+    async def _fetch_forecast(
+        self, lat: float | str, lon: float | str, units: str
+    ) -> dict | list[dict]:
+        """
+        Fetch the raw forecast payload from Open-Meteo.
+
+        `lat` and `lon` may also be comma-separated lists, in which case
+        Open-Meteo answers with one payload per coordinate pair.
+        """
+        # Convert units
+        temp_unit = "celsius" if units == "metric" else "fahrenheit"
+        wind_unit = "kmh" if units == "metric" else "mph"
+
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "current": [
+                "temperature_2m",
+                "relative_humidity_2m",
+                "apparent_temperature",
+                "weather_code",
+                "wind_speed_10m",
+                "wind_direction_10m"
+            ],
+            "hourly": [
+                "temperature_2m",
+                "weather_code",
+                "precipitation_probability"
+            ],
+            "daily": [
+                "weather_code",
+                "temperature_2m_max",
+                "temperature_2m_min",
+                "precipitation_probability_max",
+                "sunrise",
+                "sunset"
+            ],
+            "temperature_unit": temp_unit,
+            "wind_speed_unit": wind_unit,
+            "timezone": "auto",
+            "forecast_days": 7
+        }
+
+        client = self.http.get(self.base_url)
+        response = await client.get(
+            f"{self.base_url}/forecast",
+            params=params,
+            timeout=settings.weather_forecast_timeout
         )
+        response.raise_for_status()
+        data = response.json()
+        # Cached payloads keep the time they were fetched, so a stale
+        # forecast isn't labelled as new
+        fetched_at = datetime.utcnow().isoformat()
+        for payload in data if isinstance(data, list) else [data]:
+            payload[FETCHED_AT] = fetched_at
+        return data
 
     async def _reverse_geocode(self, lat: float, lon: float) -> str:
         """Get location name from coordinates"""
+        # Most coordinates are near a place we've already resolved
+        name = self.places.nearest(lat, lon)
+        if name:
+            return name
+
+        # Points in the same grid cell share one lookup
+        cell = (
+            snap(lat, settings.weather_cache_grid),
+            snap(lon, settings.weather_cache_grid)
+        )
+        return await self.geocode_flight.do(
+            cell, lambda: self._reverse_geocode_nominatim(lat, lon)
+        )
+
+    async def _reverse_geocode_nominatim(self, lat: float, lon: float) -> str:
+        """Look up a location name with Nominatim"""
+        # Past the timeout the name would be too late anyway, and booking
+        # further slots would only grow the backlog
+        if not await self.nominatim_rate.wait(settings.weather_geocode_timeout):
+            return _coordinate_label(lat, lon)
+        # A lookup that finished while this one waited may already cover it
+        name = self.places.nearest(lat, lon)
+        if name:
+            return name
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{settings.nominatim_url}/reverse",
-                    params={
-                        "lat": lat,
-                        "lon": lon,
-                        "format": "json"
-                    },
-                    headers={"User-Agent": "WeatherApp/1.0"},
-                    timeout=5.0
+            client = self.http.get(settings.nominatim_url)
+            response = await client.get(
+                f"{settings.nominatim_url}/reverse",
+                params={
+                    "lat": lat,
+                    "lon": lon,
+                    "format": "json"
+                },
+                headers={"User-Agent": "WeatherApp/1.0"},
+                timeout=settings.weather_geocode_timeout
+            )
+            if response.status_code == 200:
+                data = response.json()
+                address = data.get("address", {})
+                city = (
+                    address.get("city") or
+                    address.get("town") or
+                    address.get("village") or
+                    address.get("county")
                 )
-                if response.status_code == 200:
-                    data = response.json()
-                    address = data.get("address", {})
-                    city = (
-                        address.get("city") or
-                        address.get("town") or
-                        address.get("village") or
-                        address.get("county", "Unknown")
-                    )
-                    return city
+                if not city:
+                    # Not worth remembering: a later lookup may do better
+                    return "Unknown"
+                self.places.add(lat, lon, city)
+                return city
         except:
             pass
-        return f"{lat:.2f}, {lon:.2f}"
+        return _coordinate_label(lat, lon)
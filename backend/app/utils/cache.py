@@ -0,0 +1,104 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+from .singleflight import SingleFlight
+
+
+def snap(value: float, grid: float) -> float:
+    """Snap a coordinate to the nearest multiple of `grid` degrees"""
+    if grid <= 0:
+        return value
+    return round(round(value / grid) * grid, 6)
+
+
+class TTLCache:
+    """
+    Async LRU cache with a TTL and stale-while-revalidate.
+
+    Entries younger than `ttl` are served as hits. Entries older than `ttl`
+    but within `stale_ttl` after that are still served, while a single
+    background refresh replaces them. Anything older is a miss. Concurrent
+    misses for the same key share one fetch.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.flight = SingleFlight()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def peek(self, key: Hashable) -> Any | None:
+        """Return a fresh cached value without fetching, or None"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries"""
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Get a cached value, calling `fetch` on a miss"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if not self.flight.in_flight(key):
+                    self.refreshes += 1
+                    self.flight.start(key, lambda: self._fetch(key, fetch))
+                return value
+
+        self.misses += 1
+        return await self.flight.do(key, lambda: self._fetch(key, fetch))
+
+    async def _fetch(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        value = await fetch()
+        self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "fetch_errors": self.flight.errors,
+            "deduplicated": self.flight.deduplicated,
+            "hit_rate": (
+                (self.hits + self.stale_hits) / lookups if lookups else 0.0
+            ),
+        }
@@ -1,4 +1,24 @@
 import re
+from dataclasses import dataclass
+from itertools import accumulate, chain
+from typing import Iterable, Iterator, NamedTuple, TextIO
+from .tokens import estimate_tokens
+
+_PARAGRAPH_BREAK = re.compile(r'\n{2,}')
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])(\s+)')
+_HEADING = re.compile(r' {0,3}(#{1,6})[ \t]+(.+?)(?:[ \t]+#+)?[ \t]*$')
+_FENCE = re.compile(r' {0,3}(```|~~~)')
+
+
+@dataclass
+class Chunk:
+    """A chunk of text and the span of the source it was drawn from"""
+    text: str
+    start: int
+    end: int
+    # Titles of the markdown headings the chunk sits under, outermost first
+    headings: tuple[str, ...] = ()
 
 
 def chunk_text(
@@ -17,94 +37,563 @@ def chunk_text(
     Returns:
         List of text chunks
     """
+    # Same chunks as `iter_chunks`, but a whole string needs neither the
+    # streaming nor the offsets, and string building is faster here
     if not text or not text.strip():
         return []
 
-    # Clean up the text
-    text = text.strip()
-    text = re.sub(r'\n{3,}', '\n\n', text)  # Reduce multiple newlines
-
-    # Try to split on paragraph boundaries first
-    paragraphs = text.split('\n\n')
-
     chunks = []
-    current_chunk = ""
-
-    for para in paragraphs:
+    current = ""
+    for para in _PARAGRAPH_BREAK.split(text.strip()):
         para = para.strip()
         if not para:
             continue
 
         # If adding this paragraph exceeds chunk_size, save current and start new
-        if len(current_chunk) + len(para) + 2 > chunk_size and current_chunk:
-            chunks.append(current_chunk.strip())
+        if len(current) + len(para) + 2 > chunk_size and current:
+            chunks.append(current)
 
             # Start new chunk with overlap from previous
-            if overlap > 0 and len(current_chunk) > overlap:
-                # Get last sentences for overlap
-                overlap_text = _get_overlap_text(current_chunk, overlap)
-                current_chunk = overlap_text + " " + para
+            if overlap > 0 and len(current) > overlap:
+                current = _overlap_text(current, overlap)[0] + " " + para
             else:
-                current_chunk = para
+                current = para
+        elif current:
+            current += "\n\n" + para
         else:
-            if current_chunk:
-                current_chunk += "\n\n" + para
-            else:
-                current_chunk = para
+            current = para
 
     # Don't forget the last chunk
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
+    if current:
+        chunks.append(current)
 
     # If any chunk is still too large, split further
     final_chunks = []
     for chunk in chunks:
         if len(chunk) > chunk_size * 1.5:
-            final_chunks.extend(_split_long_chunk(chunk, chunk_size, overlap))
+            final_chunks.extend(_split_long_text(chunk, chunk_size, overlap))
         else:
             final_chunks.append(chunk)
-
     return final_chunks
 
 
-def _get_overlap_text(text: str, overlap: int) -> str:
-    """Get text for overlap, trying to end at sentence boundary"""
+def _split_long_text(text: str, chunk_size: int, overlap: int) -> list[str]:
+    """Split a chunk that's too long by sentences (text only)"""
+    chunks = []
+    current = ""
+    for sentence in _SENTENCE_BREAK.split(text):
+        if len(current) + len(sentence) + 1 > chunk_size and current:
+            chunks.append(current.strip())
+            # Add overlap
+            if overlap > 0:
+                current = _overlap_text(current, overlap)[0] + " " + sentence
+            else:
+                current = sentence
+        else:
+            current = current + " " + sentence if current else sentence
+
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+def read_blocks(file: TextIO, size: int = 64 * 1024) -> Iterator[str]:
+    """Read an open text file in fixed-size blocks, for the chunkers"""
+    while block := file.read(size):
+        yield block
+
+
+def iter_chunks(
+    stream: Iterable[str],
+    chunk_size: int = 500,
+    overlap: int = 50
+) -> Iterator[Chunk]:
+    """
+    Lazily chunk text read piece by piece (e.g. from a file object).
+
+    Produces the same chunks as `chunk_text` in a single pass, holding at
+    most one paragraph and one chunk in memory. Each chunk carries the
+    character offsets of the source span it was drawn from.
+
+    Args:
+        stream: Iterable of text pieces, such as an open file
+        chunk_size: Target size for each chunk (in characters)
+        overlap: Number of characters to overlap between chunks
+
+    Yields:
+        Chunks in document order
+    """
+    # The chunk being built: optional overlap text carried over from the
+    # previous chunk, then paragraphs joined by blank lines
+    head: _Head | None = None
+    paras: list[str] = []
+    starts: list[int] = []
+    length = 0
+
+    for para, start in _iter_paragraphs(stream):
+        # If adding this paragraph exceeds chunk_size, emit current and start new
+        if length + len(para) + 2 > chunk_size and length:
+            text = _join(head, paras, "\n\n")
+            yield from _emit(text, head, paras, starts, chunk_size, overlap)
+
+            # Start new chunk with overlap from previous
+            if overlap > 0 and length > overlap:
+                overlap_text, pos = _overlap_text(text, overlap)
+                head = _Head(
+                    overlap_text,
+                    _tail_segments(head, paras, starts, "\n\n", len(text), pos)
+                )
+                length = len(overlap_text) + 1 + len(para)
+            else:
+                head = None
+                length = len(para)
+            paras = [para]
+            starts = [start]
+        else:
+            if length:
+                length += 2
+            length += len(para)
+            paras.append(para)
+            starts.append(start)
+
+    # Don't forget the last chunk
+    if length:
+        text = _join(head, paras, "\n\n")
+        yield from _emit(text, head, paras, starts, chunk_size, overlap)
+
+
+# (position in the joined chunk, position in the parent text, length)
+_Segments = list[tuple[int, int, int]]
+
+
+class _Head(NamedTuple):
+    """Overlap text carried into the next chunk, and where it came from"""
+    text: str
+    # The overlap may span several parts of the previous chunk, which are
+    # not contiguous in the parent text
+    segments: _Segments
+
+
+def _join(head: _Head | None, parts: list[str], separator: str) -> str:
+    """A chunk's text: the overlap head, a space, then the joined parts"""
+    text = separator.join(parts)
+    if head is not None:
+        text = head.text + " " + text
+    return text
+
+
+def _segments(
+    head: _Head | None,
+    parts: list[str],
+    origins: list[int],
+    separator: str
+) -> _Segments:
+    """Where each part of a joined chunk came from"""
+    segments = []
+    pos = 0
+    if head is not None:
+        segments.extend(head.segments)
+        pos = len(head.text) + 1
+    for part, origin in zip(parts, origins):
+        segments.append((pos, origin, len(part)))
+        pos += len(part) + len(separator)
+    return segments
+
+
+def _tail_segments(
+    head: _Head | None,
+    parts: list[str],
+    origins: list[int],
+    separator: str,
+    length: int,
+    pos: int
+) -> _Segments:
+    """
+    Segments of the joined chunk (`length` characters) from `pos` on,
+    rebased to start at 0. Walks back from the end, so only the parts
+    the tail covers are visited.
+    """
+    tail = []
+    end = length
+    for part, origin in zip(reversed(parts), reversed(origins)):
+        start = end - len(part)
+        if start <= pos:
+            tail.append((pos, origin + pos - start, end - pos))
+            break
+        tail.append((start, origin, len(part)))
+        end = start - len(separator)
+    else:
+        # The tail reaches back into the chunk's own overlap head
+        if head is not None:
+            for seg_pos, origin, seg_len in reversed(head.segments):
+                if seg_pos + seg_len <= pos:
+                    break
+                if seg_pos <= pos:
+                    tail.append((pos, origin + pos - seg_pos, seg_pos + seg_len - pos))
+                    break
+                tail.append((seg_pos, origin, seg_len))
+    return [(seg_pos - pos, origin, seg_len) for seg_pos, origin, seg_len in reversed(tail)]
+
+
+def _locate(segments: _Segments, pos: int) -> int:
+    """Parent offset of a chunk position (separators map forward)"""
+    following = segments[-1][1] + segments[-1][2]
+    # Positions of interest (overlap, chunk end) are usually near the end
+    for seg_pos, origin, length in reversed(segments):
+        if pos >= seg_pos + length:
+            return following
+        if pos >= seg_pos:
+            return origin + pos - seg_pos
+        following = origin
+    return following
+
+
+def _iter_paragraphs(stream: Iterable[str]) -> Iterator[tuple[str, int]]:
+    """Yield stripped, non-empty paragraphs and their source offsets"""
+    buffer = ""
+    offset = 0
+    scan = 0
+
+    for piece in stream:
+        if not piece:
+            continue
+        buffer += piece
+
+        last = 0
+        size = len(buffer)
+        for match in _PARAGRAPH_BREAK.finditer(buffer, scan):
+            end = match.end()
+            if end == size:
+                break  # The newline run may continue in the next piece
+            raw = buffer[last:match.start()]
+            para = raw.strip()
+            if para:
+                yield para, offset + last + raw.index(para[0])
+            last = end
+
+        if last:
+            buffer = buffer[last:]
+            offset += last
+
+        # Resume scanning at trailing newlines, which may start a break
+        scan = len(buffer)
+        while scan and buffer[scan - 1] == "\n":
+            scan -= 1
+
+    para = buffer.strip()
+    if para:
+        yield para, offset + buffer.index(para[0])
+
+
+def _emit(
+    text: str,
+    head: _Head | None,
+    paras: list[str],
+    starts: list[int],
+    chunk_size: int,
+    overlap: int
+) -> Iterator[Chunk]:
+    """Finish a chunk, splitting it by sentences if it is far too long"""
+    chunk = text.strip()
+    if not chunk:
+        return
+    lead = text.index(chunk[0])
+
+    if len(chunk) > chunk_size * 1.5:
+        segments = _segments(head, paras, starts, "\n\n")
+        yield from _split_long_chunk(chunk, lead, segments, chunk_size, overlap)
+    else:
+        # From the head's first character, or the first paragraph's, to
+        # the end of the last paragraph
+        start = head.segments[0][1] if head is not None and head.text else starts[0]
+        yield Chunk(chunk, start, starts[-1] + len(paras[-1]))
+
+
+def _overlap_text(text: str, overlap: int) -> tuple[str, int]:
+    """
+    Get text for overlap, trying to start at a sentence boundary.
+
+    Returns the text and its position within `text`.
+    """
     if len(text) <= overlap:
-        return text
+        return text, 0
 
     # Take last `overlap` characters
-    overlap_region = text[-overlap:]
+    base = len(text) - overlap
+    region = text[base:]
 
     # Try to find a sentence start
-    sentence_starts = [
-        m.start() for m in re.finditer(r'(?<=[.!?])\s+', overlap_region)
-    ]
-
-    if sentence_starts:
-        return overlap_region[sentence_starts[0]:].strip()
+    match = _SENTENCE_BREAK.search(region)
+    if match:
+        base += match.start()
+        region = region[match.start():]
 
-    return overlap_region.strip()
+    overlap_text = region.strip()
+    if not overlap_text:
+        return overlap_text, base
+    return overlap_text, base + region.index(overlap_text[0])
 
 
-def _split_long_chunk(text: str, chunk_size: int, overlap: int) -> list[str]:
+def _split_long_chunk(
+    text: str,
+    lead: int,
+    parent: _Segments,
+    chunk_size: int,
+    overlap: int
+) -> Iterator[Chunk]:
     """Split a chunk that's too long by sentences"""
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+    # Sentences at even indexes, the whitespace between them at odd ones
+    pieces = _SENTENCE_SPLIT.split(text)
+    sentences = pieces[0::2]
 
-    chunks = []
-    current = ""
+    # Position of each sentence in `text`
+    origins = list(accumulate(map(len, pieces), initial=0))[0::2]
+
+    head: _Head | None = None
+    first = 0   # Index of the current group's first sentence
+    length = 0
+
+    def flush(end: int) -> Iterator[Chunk]:
+        parts = sentences[first:end]
+        joined = _join(head, parts, " ")
+        chunk = joined.strip()
+        if chunk:
+            if head is not None and head.text:
+                start = head.segments[0][1]
+            else:
+                start = origins[first]
+            stop = origins[end - 1] + len(parts[-1])
+            # Map chunk -> long chunk -> source
+            yield Chunk(
+                chunk,
+                _locate(parent, lead + start),
+                _locate(parent, lead + stop - 1) + 1
+            )
+        return joined, parts
+
+    for i, sentence in enumerate(sentences):
+        if length + len(sentence) + 1 > chunk_size and length:
+            joined, parts = yield from flush(i)
 
-    for sentence in sentences:
-        if len(current) + len(sentence) + 1 > chunk_size and current:
-            chunks.append(current.strip())
             # Add overlap
             if overlap > 0:
-                current = _get_overlap_text(current, overlap) + " " + sentence
+                overlap_text, pos = _overlap_text(joined, overlap)
+                head = _Head(
+                    overlap_text,
+                    _tail_segments(
+                        head, parts, origins[first:i], " ", len(joined), pos
+                    )
+                )
+                length = len(overlap_text) + 1 + len(sentence)
             else:
-                current = sentence
+                head = None
+                length = len(sentence)
+            first = i
+        elif length:
+            length += len(sentence) + 1
         else:
-            current = current + " " + sentence if current else sentence
+            length = len(sentence)
 
-    if current.strip():
-        chunks.append(current.strip())
+    if length:
+        yield from flush(len(sentences))
 
-    return chunks
+
+# --- Markdown-aware chunking, sized in tokens ---
+
+class _Piece(NamedTuple):
+    text: str
+    start: int
+    tokens: int
+    # Joins the piece to the one before it within a chunk
+    sep: str
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+
+# How an oversized block is broken up: by lines, then sentences, then words
+_BLOCK_SPLITS = (
+    (re.compile(r'\n'), "\n"),
+    (_SENTENCE_BREAK, " "),
+    (re.compile(r'\s+'), " "),
+)
+
+
+def iter_markdown_chunks(
+    stream: Iterable[str],
+    max_tokens: int = 256,
+    overlap_tokens: int = 32
+) -> Iterator[Chunk]:
+    """
+    Lazily chunk markdown along its heading structure, sized in tokens.
+
+    A chunk never straddles a heading, and carries the path of headings
+    it sits under. Paragraphs, lists, tables and fenced code blocks are
+    kept whole where they fit; larger blocks are broken by lines, then
+    sentences, then words. Chunks split mid-section repeat up to
+    `overlap_tokens` of the previous chunk's trailing pieces.
+
+    Args:
+        stream: Iterable of text pieces, such as an open file
+        max_tokens: Target size for each chunk (estimated tokens)
+        overlap_tokens: Tokens to overlap between chunks of a section
+
+    Yields:
+        Chunks in document order
+    """
+    path: list[tuple[int, str]] = []
+    pieces: list[_Piece] = []
+    tokens = 0
+    # Sections with only a heading are dropped; the heading is still in
+    # the path of its subsections
+    has_body = False
+
+    def emit() -> Chunk:
+        text = pieces[0].text + "".join(p.sep + p.text for p in pieces[1:])
+        return Chunk(
+            text,
+            pieces[0].start,
+            pieces[-1].end,
+            tuple(title for _, title in path)
+        )
+
+    for level, title, text, start in _iter_blocks(stream):
+        # A heading closes the current section and starts a new one
+        if level:
+            if has_body:
+                yield emit()
+            pieces, tokens, has_body = [], 0, False
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, title))
+
+        for piece in _split_block(text, start, max_tokens, "\n\n"):
+            if pieces and tokens + piece.tokens > max_tokens:
+                yield emit()
+
+                # Start the next chunk with the tail of this one
+                carried: list[_Piece] = []
+                carried_tokens = 0
+                for previous in reversed(pieces):
+                    needed = carried_tokens + previous.tokens
+                    if needed > overlap_tokens or needed + piece.tokens > max_tokens:
+                        break
+                    carried.append(previous)
+                    carried_tokens = needed
+                pieces = carried[::-1]
+                tokens = carried_tokens
+
+            pieces.append(piece)
+            tokens += piece.tokens
+        has_body = has_body or not level
+
+    if has_body:
+        yield emit()
+
+
+def _iter_lines(stream: Iterable[str]) -> Iterator[tuple[str, int]]:
+    """Yield lines (without the newline) and their source offsets"""
+    buffer = ""
+    offset = 0
+
+    for piece in stream:
+        if not piece:
+            continue
+        scan = len(buffer)
+        buffer += piece
+
+        start = 0
+        while (newline := buffer.find("\n", scan)) != -1:
+            yield buffer[start:newline], offset + start
+            start = scan = newline + 1
+
+        if start:
+            buffer = buffer[start:]
+            offset += start
+
+    if buffer:
+        yield buffer, offset
+
+
+def _iter_blocks(stream: Iterable[str]) -> Iterator[tuple[int, str, str, int]]:
+    """
+    Split markdown into blocks: headings and blank-line separated runs.
+
+    Yields (heading level or 0, heading title, block text, offset).
+    Fenced code blocks are never split on their blank lines.
+    """
+    lines: list[tuple[str, int]] = []
+    fence = None
+
+    def flush() -> Iterator[tuple[int, str, str, int]]:
+        while lines and not lines[-1][0].strip():
+            lines.pop()
+        if lines:
+            first = lines[0][0]
+            lead = len(first) - len(first.lstrip())
+            text = "\n".join(line for line, _ in lines).strip()
+            yield 0, "", text, lines[0][1] + lead
+            lines.clear()
+
+    for line, offset in _iter_lines(stream):
+        if fence:
+            lines.append((line, offset))
+            if line.strip().startswith(fence):
+                fence = None
+            continue
+
+        match = _FENCE.match(line)
+        if match:
+            fence = match.group(1)
+            lines.append((line, offset))
+            continue
+
+        heading = _HEADING.match(line.rstrip("\r"))
+        if heading:
+            yield from flush()
+            text = line.strip()
+            yield (
+                len(heading.group(1)),
+                heading.group(2),
+                text,
+                offset + line.index(text[0])
+            )
+        elif line.strip():
+            lines.append((line, offset))
+        else:
+            yield from flush()
+
+    yield from flush()
+
+
+def _split_block(
+    text: str,
+    start: int,
+    max_tokens: int,
+    sep: str,
+    depth: int = 0
+) -> Iterator[_Piece]:
+    """Break a block into pieces of at most `max_tokens` where possible"""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens or depth == len(_BLOCK_SPLITS):
+        yield _Piece(text, start, tokens, sep)
+        return
+
+    pattern, join = _BLOCK_SPLITS[depth]
+    pos = 0
+    for match in chain(pattern.finditer(text), [None]):
+        end = match.start() if match else len(text)
+        part = text[pos:end]
+        stripped = part.strip()
+        if stripped:
+            yield from _split_block(
+                stripped,
+                start + pos + part.index(stripped[0]),
+                max_tokens,
+                sep,
+                depth + 1
+            )
+            # Only the first piece takes the separator from the block before
+            sep = join
+        pos = match.end() if match else len(text)
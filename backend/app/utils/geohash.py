@@ -0,0 +1,93 @@
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.195
+
+
+def encode(lat: float, lon: float, precision: int = 9) -> str:
+    """Encode a coordinate as a geohash string"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> tuple[float, float]:
+    """Height and width of a geohash cell in degrees"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def precision_for_radius(radius_km: float) -> int:
+    """Finest precision whose cells are still at least `radius_km` across"""
+    for precision in range(9, 0, -1):
+        height, width = cell_size(precision)
+        if min(height, width) * KM_PER_DEGREE >= radius_km:
+            return precision
+    return 1
+
+
+def covering(
+    lat: float, lon: float, radius_km: float, precision: int
+) -> set[str]:
+    """Geohash cells that cover the box of `radius_km` around a point"""
+    height, width = cell_size(precision)
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlon = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+
+    cells = set()
+    steps_lat = math.ceil(2 * dlat / height) + 1
+    steps_lon = math.ceil(2 * dlon / width) + 1
+    for i in range(steps_lat + 1):
+        cell_lat = min(lat - dlat + i * height, lat + dlat)
+        cell_lat = max(min(cell_lat, 90.0), -90.0)
+        for j in range(steps_lon + 1):
+            cell_lon = min(lon - dlon + j * width, lon + dlon)
+            # Wrap around the antimeridian
+            cell_lon = (cell_lon + 180.0) % 360.0 - 180.0
+            cells.add(encode(cell_lat, cell_lon, precision))
+    return cells
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two coordinates in kilometres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2 +
+        math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,52 @@
+import asyncio
+
+
+class RateLimiter:
+    """
+    Space out calls to an upstream to at most `rate` per second.
+
+    Each caller reserves the next free slot and sleeps until it comes
+    up, so concurrent callers are served in arrival order without a
+    background task. A caller can refuse a slot that is too far away,
+    which keeps the backlog bounded when demand outruns the rate. A rate
+    of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self.calls = 0
+        self.delayed = 0
+        self.skipped = 0
+        self.waited_total = 0.0
+
+    async def wait(self, max_wait: float = None) -> bool:
+        """
+        Return True once the caller may make its request, or False at
+        once (booking nothing) if that is more than `max_wait` seconds away
+        """
+        self.calls += 1
+        if self.interval <= 0:
+            return True
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next)
+        if max_wait is not None and slot - now > max_wait:
+            self.skipped += 1
+            return False
+        self._next = slot + self.interval
+        if slot > now:
+            self.delayed += 1
+            self.waited_total += slot - now
+            await asyncio.sleep(slot - now)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "delayed": self.delayed,
+            "skipped": self.skipped,
+            "avg_wait_ms": (
+                round(self.waited_total / self.calls * 1000, 2)
+                if self.calls else 0.0
+            ),
+        }
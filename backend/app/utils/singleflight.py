@@ -0,0 +1,63 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as its own task; everyone
+    who arrives while it is running awaits the same task. Waiters are
+    shielded from each other, so a caller that is cancelled (e.g. a client
+    disconnect) stops waiting without cancelling the shared work.
+    """
+
+    def __init__(self):
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.deduplicated = 0
+        self.errors = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    def start(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Task:
+        """Get the running task for `key`, starting `fn` if there is none"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Run `fn` once per key no matter how many callers are waiting"""
+        self.calls += 1
+        if key in self._tasks:
+            self.deduplicated += 1
+        task = self.start(key, fn)
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Retrieve the exception so abandoned failures aren't logged as
+        # never-retrieved; waiters still get it from the task
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self._tasks),
+            "errors": self.errors,
+        }
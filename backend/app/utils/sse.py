@@ -0,0 +1,80 @@
+import asyncio
+import json
+from typing import AsyncIterator
+from ..config import get_settings
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib encoder is used without it
+    orjson = None
+
+settings = get_settings()
+
+
+def sse_event(payload: dict) -> bytes:
+    """One Server-Sent Events frame: `data: <compact JSON>` and a blank line"""
+    if orjson is not None:
+        return b"data: " + orjson.dumps(payload) + b"\n\n"
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return f"data: {data}\n\n".encode()
+
+
+async def coalesce_tokens(
+    tokens: AsyncIterator[str],
+    window: float = None,
+    max_bytes: int = None
+) -> AsyncIterator[list[str]]:
+    """
+    Group a token stream into batches, one SSE frame each.
+
+    At most one frame goes out per `window` seconds: a token that
+    arrives later than that after the previous frame is sent at once
+    (so the first token and slow streams are never delayed), otherwise
+    it waits for the window to close. A batch reaching `max_bytes` of
+    text is sent early. A window of 0 turns batching off.
+    """
+    window = settings.sse_flush_window if window is None else window
+    max_bytes = max_bytes or settings.sse_flush_bytes
+    iterator = aiter(tokens)
+    if window <= 0:
+        async for token in iterator:
+            yield [token]
+        return
+
+    loop = asyncio.get_running_loop()
+    batch: list[str] = []
+    size = 0
+    last_flush = loop.time() - window
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+            timeout = max(last_flush + window - loop.time(), 0) if batch else None
+            done, _ = await asyncio.wait([pending], timeout=timeout)
+            if not done:
+                # Window is up; the next token is still on its way
+                last_flush = loop.time()
+                yield batch
+                batch, size = [], 0
+                continue
+
+            read, pending = pending, None
+            try:
+                token = read.result()
+            except StopAsyncIteration:
+                break
+            batch.append(token)
+            size += len(token.encode())
+            if size >= max_bytes or loop.time() - last_flush >= window:
+                last_flush = loop.time()
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
+    finally:
+        if pending is not None:
+            # Cancelling the read also unwinds the token source
+            pending.cancel()
+        elif hasattr(iterator, "aclose"):
+            await iterator.aclose()
@@ -0,0 +1,71 @@
+import time
+from contextlib import contextmanager
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """Per-request wall-clock timings for named pipeline stages"""
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def elapsed(self) -> float:
+        """Seconds since the timer was created"""
+        return time.perf_counter() - self._start
+
+    def record(self, name: str, seconds: float):
+        self.stages[name] = seconds * 1000
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a synchronous block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    async def timed(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Await something and record how long it took"""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def as_dict(self) -> dict[str, float]:
+        """Stage durations in milliseconds, plus the total so far"""
+        timings = {name: round(ms, 2) for name, ms in self.stages.items()}
+        timings["total"] = round(self.elapsed() * 1000, 2)
+        return timings
+
+    def server_timing(self) -> str:
+        """Format as a Server-Timing header value"""
+        return ", ".join(
+            f"{name};dur={ms}" for name, ms in self.as_dict().items()
+        )
+
+
+class LatencyStats:
+    """Running count/average/max per stage across many requests"""
+
+    def __init__(self):
+        self._stages: dict[str, tuple[int, float, float]] = {}
+
+    def add(self, timer: StageTimer):
+        for name, ms in timer.as_dict().items():
+            count, total, worst = self._stages.get(name, (0, 0.0, 0.0))
+            self._stages[name] = (count + 1, total + ms, max(worst, ms))
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "count": count,
+                "avg_ms": round(total / count, 2),
+                "max_ms": round(worst, 2),
+            }
+            for name, (count, total, worst) in self._stages.items()
+        }
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Chunker Benchmark
+
+Times the streaming chunker (`iter_chunks`) against the original
+whole-string implementation on a generated multi-MB document, checks that
+both produce exactly the same chunks, checks that every chunk's source
+span matches its text, and compares peak memory when chunking a file on
+disk.
+
+Usage:
+    python -m scripts.bench_chunker
+    or
+    python scripts/bench_chunker.py --size-mb 8
+"""
+
+import argparse
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.utils.chunker import chunk_text, iter_chunks
+
+
+# --- Reference: the chunker as it was before iter_chunks ---
+
+def legacy_chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> list[str]:
+    if not text or not text.strip():
+        return []
+
+    text = text.strip()
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    paragraphs = text.split('\n\n')
+
+    chunks = []
+    current_chunk = ""
+
+    for para in paragraphs:
+        para = para.strip()
+        if not para:
+            continue
+
+        if len(current_chunk) + len(para) + 2 > chunk_size and current_chunk:
+            chunks.append(current_chunk.strip())
+            if overlap > 0 and len(current_chunk) > overlap:
+                overlap_text = _legacy_overlap_text(current_chunk, overlap)
+                current_chunk = overlap_text + " " + para
+            else:
+                current_chunk = para
+        else:
+            if current_chunk:
+                current_chunk += "\n\n" + para
+            else:
+                current_chunk = para
+
+    if current_chunk.strip():
+        chunks.append(current_chunk.strip())
+
+    final_chunks = []
+    for chunk in chunks:
+        if len(chunk) > chunk_size * 1.5:
+            final_chunks.extend(_legacy_split_long_chunk(chunk, chunk_size, overlap))
+        else:
+            final_chunks.append(chunk)
+
+    return final_chunks
+
+
+def _legacy_overlap_text(text: str, overlap: int) -> str:
+    if len(text) <= overlap:
+        return text
+
+    overlap_region = text[-overlap:]
+    sentence_starts = [
+        m.start() for m in re.finditer(r'(?<=[.!?])\s+', overlap_region)
+    ]
+    if sentence_starts:
+        return overlap_region[sentence_starts[0]:].strip()
+
+    return overlap_region.strip()
+
+
+def _legacy_split_long_chunk(text: str, chunk_size: int, overlap: int) -> list[str]:
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+
+    chunks = []
+    current = ""
+
+    for sentence in sentences:
+        if len(current) + len(sentence) + 1 > chunk_size and current:
+            chunks.append(current.strip())
+            if overlap > 0:
+                current = _legacy_overlap_text(current, overlap) + " " + sentence
+            else:
+                current = sentence
+        else:
+            current = current + " " + sentence if current else sentence
+
+    if current.strip():
+        chunks.append(current.strip())
+
+    return chunks
+
+
+# --- Benchmark ---
+
+_WHITESPACE = re.compile(r'\s+')
+
+WORDS = (
+    "weather forecast rain snow wind humidity pressure front storm cloud "
+    "temperature dew point heat index visibility gust sunny overcast drizzle"
+).split()
+
+
+def make_document(size_mb: float, seed: int = 42) -> str:
+    """Markdown-ish text: headings, short and very long paragraphs"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    total = 0
+    while total < target:
+        if rng.random() < 0.05:
+            block = "## " + " ".join(rng.choices(WORDS, k=3)).title()
+        else:
+            sentences = rng.choices(range(1, 8), k=1)[0]
+            # Occasionally a wall of text that needs sentence splitting
+            if rng.random() < 0.03:
+                sentences = rng.randint(30, 80)
+            block = " ".join(
+                " ".join(rng.choices(WORDS, k=rng.randint(4, 18))).capitalize()
+                + rng.choice(".!?")
+                for _ in range(sentences)
+            )
+        parts.append(block)
+        parts.append(rng.choice(["\n\n", "\n\n", "\n\n\n", "\n"]))
+        total += len(block) + 2
+    return "".join(parts)
+
+
+def best_of(runs: int, fn) -> tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def read_blocks(path: Path, size: int = 64 * 1024):
+    """Stream a file in fixed-size blocks"""
+    with open(path, encoding="utf-8") as f:
+        while block := f.read(size):
+            yield block
+
+
+def peak_memory(fn) -> float:
+    """Peak traced allocation of `fn()` in MB"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def consume(chunks) -> int:
+    """Count chunks without keeping them, as an ingest stage would"""
+    return sum(1 for _ in chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the KB chunker")
+    parser.add_argument("--size-mb", type=float, default=4.0)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Chunker Benchmark")
+    print("=" * 50)
+
+    text = make_document(args.size_mb)
+    mb = len(text) / (1024 * 1024)
+    print(f"Document: {mb:.1f} MB, chunk_size={args.chunk_size}, overlap={args.overlap}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "kb.md"
+        path.write_text(text, encoding="utf-8")
+
+        legacy_time, expected = best_of(
+            args.runs,
+            lambda: legacy_chunk_text(text, args.chunk_size, args.overlap)
+        )
+        string_time, from_string = best_of(
+            args.runs,
+            lambda: chunk_text(text, args.chunk_size, args.overlap)
+        )
+        stream_time, from_stream = best_of(
+            args.runs,
+            lambda: [
+                chunk.text for chunk in iter_chunks(
+                    read_blocks(path), args.chunk_size, args.overlap
+                )
+            ]
+        )
+
+        if from_string != expected or from_stream != expected:
+            print("[ERROR] Chunk boundaries differ from the reference implementation")
+            sys.exit(1)
+        print(f"[OK] {len(expected)} identical chunks")
+
+        # Each chunk's span must hold the same text, up to whitespace
+        spans = list(iter_chunks(read_blocks(path), args.chunk_size, args.overlap))
+        bad = sum(
+            1 for chunk in spans
+            if _WHITESPACE.sub(" ", text[chunk.start:chunk.end]) != _WHITESPACE.sub(" ", chunk.text)
+        )
+        if bad:
+            print(f"[ERROR] {bad} chunks have a source span that doesn't match their text")
+            sys.exit(1)
+        print("[OK] Source spans match chunk text")
+
+        legacy_peak = peak_memory(lambda: consume(legacy_chunk_text(
+            path.read_text(encoding="utf-8"), args.chunk_size, args.overlap
+        )))
+        stream_peak = peak_memory(lambda: consume(iter_chunks(
+            read_blocks(path), args.chunk_size, args.overlap
+        )))
+
+    print()
+    print(f"{'':<22} {'time':>11}  {'throughput':>12}  {'peak memory':>11}")
+    for name, seconds, peak in (
+        ("legacy chunk_text", legacy_time, legacy_peak),
+        ("chunk_text", string_time, None),
+        ("iter_chunks (file)", stream_time, stream_peak),
+    ):
+        memory = f"{peak:8.1f} MB" if peak is not None else ""
+        print(
+            f"{name:<22} {seconds * 1000:8.1f} ms  {mb / seconds:7.1f} MB/s  {memory:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
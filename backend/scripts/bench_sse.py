@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+/chat SSE Framing Benchmark
+
+Replays a simulated answer, one token every --interval-ms, through the
+/chat token framing and reports SSE frames and bytes per answer, plus
+how long the batching held tokens back. Window 0 is one frame per
+token, as /chat used to send. Also times frame encoding with the
+stdlib json module and with orjson (if installed).
+
+Usage:
+    python -m scripts.bench_sse
+    or
+    python scripts/bench_sse.py --tokens 200 --interval-ms 10,40 --windows-ms 0,30,100
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.utils import sse
+from app.utils.sse import coalesce_tokens, sse_event
+
+
+def load_tokens(count: int) -> list[str]:
+    """Word pieces of KB text with their leading spaces, like LLM tokens"""
+    kb_dir = Path(__file__).parent.parent.parent / "kb"
+    text = " ".join(
+        path.read_text(encoding="utf-8") for path in sorted(kb_dir.rglob("*.md"))
+    )
+    pieces = re.findall(r"\s*[^\s]+", text)
+    return (pieces * (count // max(len(pieces), 1) + 1))[:count]
+
+
+def legacy_event(payload: dict) -> bytes:
+    """Frame encoding as /chat did it before (per token, stdlib json)"""
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+async def replay(
+    tokens: list[str],
+    interval: float,
+    window: float,
+    max_bytes: int
+) -> dict:
+    produced: list[float] = []
+
+    async def model():
+        for token in tokens:
+            await asyncio.sleep(interval)
+            produced.append(time.perf_counter())
+            yield token
+
+    frames = 0
+    size = 0
+    delivered = 0
+    held = []
+    encode = sse_event if window > 0 else legacy_event
+    async for batch in coalesce_tokens(model(), window=window, max_bytes=max_bytes):
+        now = time.perf_counter()
+        frame = encode({"type": "token", "content": "".join(batch)})
+        frames += 1
+        size += len(frame)
+        held.extend(now - produced[i] for i in range(delivered, delivered + len(batch)))
+        delivered += len(batch)
+
+    return {
+        "frames": frames,
+        "bytes": size,
+        "tokens_per_frame": delivered / frames,
+        "max_held_ms": max(held) * 1000,
+    }
+
+
+def encode_timing(tokens: list[str], rounds: int = 20) -> dict:
+    payloads = [{"type": "token", "content": token} for token in tokens]
+    timings = {"json": legacy_event}
+    if sse.orjson is not None:
+        timings["orjson"] = sse_event
+    results = {}
+    for name, encode in timings.items():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for payload in payloads:
+                encode(payload)
+        results[name] = (time.perf_counter() - start) / (rounds * len(payloads)) * 1e6
+    return results
+
+
+async def main(args: argparse.Namespace):
+    print("=" * 50)
+    print("/chat SSE Framing Benchmark")
+    print("=" * 50)
+
+    tokens = load_tokens(args.tokens)
+    intervals = [float(ms) / 1000 for ms in args.interval_ms.split(",")]
+    windows = [float(ms) / 1000 for ms in args.windows_ms.split(",")]
+
+    print(f"{args.tokens} tokens per answer, max {args.max_bytes} bytes per frame\n")
+    print(f"{'interval':>9} {'window':>7} {'frames':>7} {'bytes':>7} {'tok/frame':>10} {'max held':>9}")
+    for interval in intervals:
+        for window in windows:
+            r = await replay(tokens, interval, window, args.max_bytes)
+            print(
+                f"{interval * 1000:7.0f}ms {window * 1000:5.0f}ms {r['frames']:>7} "
+                f"{r['bytes']:>7} {r['tokens_per_frame']:>10.1f} {r['max_held_ms']:7.1f}ms"
+            )
+
+    print("\nFrame encoding:")
+    for name, us in encode_timing(tokens).items():
+        print(f"   {name:<7} {us:.2f} us/frame")
+    if sse.orjson is None:
+        print("   (orjson not installed)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /chat SSE framing")
+    parser.add_argument("--tokens", type=int, default=150)
+    parser.add_argument("--interval-ms", default="10,40")
+    parser.add_argument("--windows-ms", default="0,30,100")
+    parser.add_argument("--max-bytes", type=int, default=512)
+    asyncio.run(main(parser.parse_args()))
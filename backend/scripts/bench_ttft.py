@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Chat Time-to-First-Token Benchmark
+
+Measures TTFT of /chat-style generations against a local mock Ollama
+server that simulates the costs that matter on a CPU-only box:
+
+- a one-off model load for the first request;
+- prefill time for every prompt token that doesn't extend the previous
+  request's prompt (the part Ollama cannot serve from its KV cache).
+
+It compares the previous prompt layout (KB context and weather inside
+the system prompt, ahead of the instructions, no warm-up) with the
+current one (static system prompt, variable sections in the user turn,
+model warm-up at startup).
+
+Usage:
+    python -m scripts.bench_ttft
+    or
+    python scripts/bench_ttft.py --requests 20 --prefill-ms 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.models import ChatMessage
+from app.services.embed_cache import EmbeddingCache
+from app.services.http_client import HTTPClientRegistry
+from app.services.ollama import OllamaService
+from app.services.prompt import SYSTEM_PROMPT, build_user_message
+from app.utils.chunker import iter_markdown_chunks
+from app.utils.tokens import estimate_tokens
+
+QUESTIONS = [
+    "What does a UV index of 8 mean?",
+    "Is it safe to run outside when the AQI is 150?",
+    "What is the 30-30 rule for lightning?",
+    "How does wind chill work?",
+    "Should I go hiking if there's a chance of thunderstorms?",
+    "What is the difference between dew point and humidity?",
+    "How much sunscreen do I need?",
+    "When is heat index dangerous?",
+]
+
+WEATHER = """Current weather in Paris:
+- Temperature: 24°C (feels like 25°C)
+- Conditions: Partly cloudy
+- Humidity: 61%
+- Wind: 12 km/h"""
+
+
+def legacy_system_prompt(context_text: str, weather_context: str) -> str:
+    """The system prompt as /chat built it before the layout change"""
+    return f"""You are a helpful weather assistant. Use the following knowledge base context and current weather data to answer questions accurately. Always cite your sources when using information from the knowledge base.
+
+Knowledge Base Context:
+{context_text}
+
+{weather_context}
+
+Guidelines:
+- Be concise and helpful
+- For weather data, use the current weather information provided
+- For explanations about weather concepts, UV, AQI, safety tips, cite the knowledge base
+- If you don't know something, say so
+- If the user asks about a specific time or location not provided, ask for clarification"""
+
+
+# --- Mock Ollama ---
+
+class MockOllama(ThreadingHTTPServer):
+    """One model slot: requests are served one at a time, like Ollama"""
+
+    def __init__(self, load_s: float, prefill_ms: float, decode_ms: float):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.load_s = load_s
+        self.prefill_ms = prefill_ms
+        self.decode_ms = decode_ms
+        self.loaded = False
+        self.cached_prompt = ""
+        self.prefilled_tokens = 0
+        self.slot = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def prefill(self, messages: list[dict]) -> float:
+        """Seconds to load and prefill, updating the cached prompt"""
+        prompt = "".join(f"<|{m['role']}|>{m['content']}" for m in messages)
+        shared = len(os.path.commonprefix([prompt, self.cached_prompt]))
+        tokens = estimate_tokens(prompt[shared:])
+        self.cached_prompt = prompt
+        self.prefilled_tokens += tokens
+
+        seconds = tokens * self.prefill_ms / 1000
+        if not self.loaded:
+            self.loaded = True
+            seconds += self.load_s
+        return seconds
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server: MockOllama = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        if self.path in ("/api/embed", "/api/embeddings"):
+            inputs = body.get("input", body.get("prompt"))
+            count = len(inputs) if isinstance(inputs, list) else 1
+            vector = [0.1] * 8
+            payload = (
+                {"embeddings": [vector] * count}
+                if self.path == "/api/embed" else {"embedding": vector}
+            )
+            self._send_json(payload)
+            return
+
+        with server.slot:
+            time.sleep(server.prefill(body["messages"]))
+            options = body.get("options", {})
+            tokens = min(options.get("num_predict", 32), 32)
+
+            if not body.get("stream", True):
+                self._send_json({"message": {"content": "ok"}, "done": True})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for i in range(tokens):
+                if i:
+                    time.sleep(server.decode_ms / 1000)
+                line = {"message": {"content": f"tok{i} "}, "done": False}
+                self.wfile.write((json.dumps(line) + "\n").encode())
+                self.wfile.flush()
+            self.wfile.write((json.dumps({"done": True}) + "\n").encode())
+
+    def _send_json(self, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+# --- Benchmark ---
+
+def load_chunks() -> list[str]:
+    kb_dir = Path(__file__).parent.parent.parent / "kb"
+    chunks = []
+    for path in sorted(kb_dir.rglob("*.md")):
+        text = path.read_text(encoding="utf-8")
+        chunks.extend(
+            f"[{path.name}]: {chunk.text}" for chunk in iter_markdown_chunks([text])
+        )
+    return chunks
+
+
+def make_requests(count: int, seed: int = 7) -> list[tuple[str, str, str]]:
+    """(question, KB context, weather) for each request"""
+    rng = random.Random(seed)
+    chunks = load_chunks()
+    requests = []
+    for i in range(count):
+        context = "\n\n".join(rng.sample(chunks, min(4, len(chunks))))
+        weather = WEATHER if i % 2 else ""
+        requests.append((QUESTIONS[i % len(QUESTIONS)], context, weather))
+    return requests
+
+
+async def time_to_first_token(
+    ollama: OllamaService,
+    system_prompt: str,
+    user_message: str,
+    history: list[ChatMessage]
+) -> float:
+    start = time.perf_counter()
+    ttft = None
+    async for _ in ollama.generate_stream(system_prompt, user_message, history):
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft
+
+
+async def run(layout: str, requests: list, args: argparse.Namespace) -> dict:
+    server = MockOllama(args.load_s, args.prefill_ms, args.decode_ms)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    http = HTTPClientRegistry()
+    cache = EmbeddingCache(path=":memory:")
+    ollama = OllamaService(http, cache)
+    ollama.base_url = server.url
+
+    try:
+        if layout == "current":
+            # What the server does at startup, before any user arrives
+            await ollama.warm_up(SYSTEM_PROMPT)
+            warm_tokens = server.prefilled_tokens
+        else:
+            warm_tokens = 0
+
+        ttfts = []
+        for question, context, weather in requests:
+            if layout == "current":
+                system_prompt = SYSTEM_PROMPT
+                user_message = build_user_message(question, context, weather)
+            else:
+                system_prompt = legacy_system_prompt(context, weather)
+                user_message = question
+            ttfts.append(await time_to_first_token(
+                ollama, system_prompt, user_message, []
+            ))
+    finally:
+        await http.aclose()
+        cache.close()
+        server.shutdown()
+        server.server_close()
+
+    return {
+        "first": ttfts[0],
+        "mean": statistics.mean(ttfts),
+        "p50": statistics.median(ttfts),
+        "p95": sorted(ttfts)[int(0.95 * (len(ttfts) - 1))],
+        "prefilled": server.prefilled_tokens - warm_tokens,
+    }
+
+
+async def main(args: argparse.Namespace):
+    print("=" * 50)
+    print("Chat TTFT Benchmark (mock Ollama)")
+    print("=" * 50)
+    print(
+        f"Model load {args.load_s:.1f}s, prefill {args.prefill_ms}ms/token, "
+        f"{args.requests} requests"
+    )
+
+    requests = make_requests(args.requests)
+    results = {
+        "before": await run("legacy", requests, args),
+        "after": await run("current", requests, args),
+    }
+
+    print()
+    print(f"{'':<8} {'first':>9} {'mean':>9} {'p50':>9} {'p95':>9} {'prefilled':>10}")
+    for name, r in results.items():
+        print(
+            f"{name:<8} {r['first'] * 1000:7.0f}ms {r['mean'] * 1000:7.0f}ms "
+            f"{r['p50'] * 1000:7.0f}ms {r['p95'] * 1000:7.0f}ms {r['prefilled']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chat TTFT")
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--load-s", type=float, default=1.5)
+    parser.add_argument("--prefill-ms", type=float, default=2.0)
+    parser.add_argument("--decode-ms", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
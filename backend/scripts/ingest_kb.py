@@ -2,15 +2,26 @@
 """
 Knowledge Base Ingestion Script
 
-This script ingests all markdown files from the kb/ directory into Qdrant.
+This script syncs all markdown files under the kb/ directory (recursively)
+into Qdrant, streaming them through concurrent read, embed and upsert
+stages.
+Chunks are content-addressed, so only new or changed chunks are embedded
+and chunks that disappeared from the KB are deleted.
 Run this after starting Ollama and Qdrant services.
 
+With --rebuild (e.g. after changing the embedding model) everything is
+ingested into a new versioned collection in the background and the
+collection alias is swapped over only once it is complete, so /chat
+keeps serving the old KB meanwhile. --rollback points the alias back at
+the previous version.
+
 Usage:
-    python -m scripts.ingest_kb
+    python -m scripts.ingest_kb [--rebuild | --rollback]
     or
-    python scripts/ingest_kb.py
+    python scripts/ingest_kb.py [--rebuild | --rollback]
 """
 
+import argparse
 import asyncio
 import sys
 from pathlib import Path
@@ -20,20 +31,57 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.services.ollama import OllamaService
 from app.services.qdrant import QdrantService
+from app.services.vector_store import create_vector_store
 from app.services.rag import RAGService
+from app.services.http_client import HTTPClientRegistry
+from app.services.embed_cache import EmbeddingCache
+from app.services.ingest import IngestPipeline
 
 
-async def main():
+async def main(args: argparse.Namespace):
     print("=" * 50)
     print("Weather App Knowledge Base Ingestion")
     print("=" * 50)
 
     # Initialize services
     print("\n[1/4] Initializing services...")
-    ollama = OllamaService()
-    qdrant = QdrantService()
-    rag = RAGService(ollama, qdrant)
+    http_clients = HTTPClientRegistry()
+    embed_cache = EmbeddingCache()
+    ollama = OllamaService(http_clients, embed_cache)
+    qdrant = create_vector_store()
+    await qdrant.start()
+
+    try:
+        if args.rollback:
+            await rollback(ollama, qdrant)
+        else:
+            await ingest(ollama, qdrant, args.rebuild)
+    finally:
+        await http_clients.aclose()
+        await qdrant.close()
+        embed_cache.close()
+
+
+async def rollback(ollama: OllamaService, qdrant: QdrantService):
+    """Point the alias back at the previous KB version"""
+    print("\nRolling back...")
+    active = await qdrant.active_version()
+    previous = await qdrant.rollback()
+    if previous is None:
+        print(f"[ERROR] No version older than {active} to roll back to")
+        return
+    print(f"[OK] {qdrant.collection_name} now points at {previous} (was {active})")
+
+    index = await RAGService(ollama, qdrant).rebuild_lexical()
+    print(f"[OK] Lexical index rebuilt: {len(index)} chunks (version {index.version})")
+
 
+async def ingest(
+    ollama: OllamaService,
+    qdrant: QdrantService,
+    rebuild: bool
+):
+    """Check service health and ingest every KB file"""
     # Check services health
     print("\n[2/4] Checking service health...")
 
@@ -62,41 +110,88 @@ async def main():
         print(f"[ERROR] KB directory not found: {kb_dir}")
         return
 
-    # Find all markdown files
-    md_files = list(kb_dir.glob("*.md"))
-    if not md_files:
+    # Make sure there is something to ingest before touching Qdrant
+    if next(kb_dir.rglob("*.md"), None) is None:
         print(f"[ERROR] No markdown files found in {kb_dir}")
         return
 
-    print(f"\n[3/4] Found {len(md_files)} KB files:")
-    for f in md_files:
-        print(f"   - {f.name}")
-
-    # Clear existing collection (optional - for fresh start)
-    print("\n[4/4] Ingesting documents...")
-    await qdrant.delete_collection()
-    print("   Cleared existing collection")
-
-    total_chunks = 0
-
-    for md_file in md_files:
-        print(f"\n   Processing: {md_file.name}")
-
-        try:
-            content = md_file.read_text(encoding="utf-8")
-            chunks_added = await rag.ingest(content, md_file.name)
-            total_chunks += chunks_added
-            print(f"   [OK] Added {chunks_added} chunks")
-        except Exception as e:
-            print(f"   [ERROR] Error: {e}")
+    print(f"\n[3/4] Walking {kb_dir} for markdown files")
+
+    if rebuild:
+        # Fill a fresh version while the alias keeps serving the old one
+        version = await qdrant.create_version()
+        target = qdrant.for_collection(version)
+        print(f"\n[4/4] Rebuilding into {version}...")
+    else:
+        # Only embed what changed since the last run
+        target = qdrant
+        print("\n[4/4] Syncing documents...")
+
+    # A rebuild that doesn't go live is deleted, so rollback and
+    # retention never mistake a half-filled version for a real one
+    activated = not rebuild
+    try:
+        rag = RAGService(ollama, target)
+
+        # Sources are paths relative to kb/, so top-level files keep their names
+        files = (
+            (path, path.relative_to(kb_dir).as_posix())
+            for path in kb_dir.rglob("*.md")
+        )
+        pipeline = IngestPipeline(
+            rag, on_progress=lambda stats: print(f"   ... {stats.summary()}")
+        )
+        stats = await pipeline.run(files)
+
+        for error in stats.errors:
+            print(f"   [ERROR] {error}")
+
+        # Drop documents that were removed from the KB directory
+        for source in sorted(await target.sources() - stats.sources):
+            deleted = await rag.remove_source(source)
+            stats.deleted += deleted
+            print(f"   Removed: {source} (-{deleted} chunks)")
+
+        if rebuild and stats.failed:
+            print(f"\n[ERROR] Not switching to {version}: some files failed")
+            print("   The current KB is still live; fix the errors and rerun")
+            return
+
+        if rebuild:
+            await qdrant.activate(version)
+            activated = True
+            print(f"\n   Switched {qdrant.collection_name} to {version}")
+            for removed in await qdrant.prune_versions():
+                print(f"   Dropped old version {removed}")
+    finally:
+        if not activated:
+            await qdrant.drop_version(version)
+            print(f"   Dropped unfinished version {version}")
+
+    # Keyword search runs on its own index of whatever the alias serves
+    index = await RAGService(ollama, qdrant).rebuild_lexical()
+    print(f"   Lexical index: {len(index)} chunks (version {index.version})")
 
     # Summary
     final_count = await qdrant.count()
     print("\n" + "=" * 50)
     print("Ingestion Complete!")
+    print(stats.summary())
     print(f"Total chunks in collection: {final_count}")
     print("=" * 50)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Ingest the knowledge base")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="build a new collection version and swap the alias to it"
+    )
+    mode.add_argument(
+        "--rollback",
+        action="store_true",
+        help="point the alias back at the previous collection version"
+    )
+    asyncio.run(main(parser.parse_args()))
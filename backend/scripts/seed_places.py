@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Place Store Seeding Script
+
+Pre-loads the reverse-geocode place store from a CSV file so most
+/weather requests never need a Nominatim lookup. The CSV needs a header
+row with `name`, `lat` and `lon` columns (extra columns are ignored).
+
+Usage:
+    python -m scripts.seed_places cities.csv
+    or
+    python scripts/seed_places.py cities.csv
+"""
+
+import csv
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.places import PlaceStore
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python -m scripts.seed_places <places.csv>")
+        sys.exit(1)
+
+    csv_path = Path(sys.argv[1])
+    if not csv_path.exists():
+        print(f"[ERROR] File not found: {csv_path}")
+        sys.exit(1)
+
+    store = PlaceStore()
+    print(f"Seeding {store.path} from {csv_path.name}...")
+
+    added = 0
+    skipped = 0
+    batch = []
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                batch.append((float(row["lat"]), float(row["lon"]), row["name"]))
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+                continue
+
+            if len(batch) >= 10000:
+                added += store.add_many(batch)
+                batch = []
+
+    if batch:
+        added += store.add_many(batch)
+
+    print(f"[OK] Added {added} places ({skipped} rows skipped)")
+    print(f"Total places in store: {store.count()}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -25,8 +25,9 @@ export function useChat() {
       // Add user message
       addUserMessage(content.trim());
 
-      // Prepare history for API (last 6 messages)
-      const history = messages.slice(-6).map((m) => ({
+      // Prepare history for API; the backend trims it to fit the model's
+      // context window
+      const history = messages.slice(-20).map((m) => ({
         role: m.role,
         content: m.content,
       }));
@@ -85,6 +85,13 @@ class ApiClient {
       }),
     });
 
+    if (response.status === 429) {
+      const retryAfter = response.headers.get('Retry-After');
+      throw new Error(
+        `The assistant is busy, please try again${retryAfter ? ` in ${retryAfter}s` : ''}`
+      );
+    }
+
     if (!response.ok) {
       throw new Error(`Chat API error: ${response.status}`);
     }